@@ -0,0 +1,391 @@
+import json
+import random
+from email.parser import BytesParser
+from email.policy import HTTP
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+_LINE = re.compile(r"^\[(?P<id>[^\]]+)\] (?:(?P<role>\w+): )?(?P<text>.*)$", re.MULTILINE)
+_TASK = re.compile(r"пожалуйста|сделайте|исправьте|добавьте|пришлите|можете|please|fix|\?", re.IGNORECASE)
+_NUMBER = re.compile(r"№\d+")
+
+
+class FakeOpenAIStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.completions = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "connections": self.connections,
+                "requests": self.requests,
+                "completions": self.completions,
+                "rate_limited": self.rate_limited,
+                "errors": self.errors,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+
+def _section(prompt: str, start_marker: str, end_marker: Optional[str] = None) -> str:
+    start = prompt.find(start_marker)
+    if start < 0:
+        return ""
+    start += len(start_marker)
+    end = prompt.find(end_marker, start) if end_marker else -1
+    return prompt[start:end if end >= 0 else len(prompt)]
+
+
+def _answer_extraction(prompt: str) -> List[Dict[str, Any]]:
+    tasks = []
+    for match in _LINE.finditer(_section(prompt, "найди все задачи клиента:", "Верни только JSON")):
+        if match.group("role") == "client" and _TASK.search(match.group("text")):
+            tasks.append({
+                "description": match.group("text"),
+                "message_id": int(match.group("id")),
+                "priority": "medium",
+                "context": match.group("text"),
+            })
+    return tasks
+
+
+def _verdict(task_text: str, responses: List[re.Match]) -> Dict[str, Any]:
+    numbers = set(_NUMBER.findall(task_text))
+    for response in responses:
+        if numbers & set(_NUMBER.findall(response.group("text"))):
+            return {"completed": True, "response_message_id": int(response.group("id")), "evidence": response.group("text")}
+    return {"completed": False, "response_message_id": None, "evidence": "Подтверждения нет"}
+
+
+def _answer_completion(prompt: str) -> Dict[str, Any]:
+    responses = list(_LINE.finditer(_section(prompt, "Ответы разработчика:", "Определи:")))
+    return _verdict(_section(prompt, "Задача клиента:", "Ответы разработчика:"), responses)
+
+
+def _answer_batch_completion(prompt: str) -> List[Dict[str, Any]]:
+    responses = list(_LINE.finditer(_section(prompt, "Ответы разработчика:", "Для каждой задачи")))
+    results = []
+    for match in _LINE.finditer(_section(prompt, "Задачи клиента:", "Ответы разработчика:")):
+        if match.group("id").startswith("T"):
+            results.append({"task_id": match.group("id"), **_verdict(match.group("text"), responses)})
+    return results
+
+
+def answer_prompt(prompt: str) -> Any:
+    if "Задачи клиента:" in prompt:
+        return {"results": _answer_batch_completion(prompt)}
+    if "Задача клиента:" in prompt:
+        return _answer_completion(prompt)
+    return {"tasks": _answer_extraction(prompt)}
+
+
+class FakeOpenAIServer:
+    def __init__(self, latency: float = 0.2, jitter: float = 0.5, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 1.0, seed: int = 42,
+                 host: str = "127.0.0.1", port: int = 0, requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None, malformed_rate: float = 0.0,
+                 max_completion_tokens: Optional[int] = None, token_latency: float = 0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.malformed_rate = malformed_rate
+        self.max_completion_tokens = max_completion_tokens
+        self._window: Deque[Tuple[float, int]] = deque()
+        self._window_tokens = 0
+        self._window_lock = threading.Lock()
+        self.batch_duration = 0.5
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._batch_lock = threading.Lock()
+        self.stats = FakeOpenAIStats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    @staticmethod
+    def prompt_tokens(body: Dict[str, Any]) -> int:
+        return len("".join(m.get("content") or "" for m in body["messages"])) // 3
+
+    def admit(self, tokens: int) -> Tuple[Optional[float], Dict[str, str]]:
+        with self._window_lock:
+            now = time.monotonic()
+            while self._window and self._window[0][0] <= now - 60:
+                self._window_tokens -= self._window.popleft()[1]
+            
+            headers = {}
+            if self.requests_per_minute:
+                headers["x-ratelimit-limit-requests"] = str(self.requests_per_minute)
+                headers["x-ratelimit-remaining-requests"] = str(max(0, self.requests_per_minute - len(self._window)))
+            if self.tokens_per_minute:
+                headers["x-ratelimit-limit-tokens"] = str(self.tokens_per_minute)
+                headers["x-ratelimit-remaining-tokens"] = str(max(0, self.tokens_per_minute - self._window_tokens))
+            
+            over_requests = self.requests_per_minute and len(self._window) + 1 > self.requests_per_minute
+            over_tokens = self.tokens_per_minute and self._window_tokens + tokens > self.tokens_per_minute
+            if (over_requests or over_tokens) and self._window:
+                return self._window[0][0] + 60 - now, headers
+            
+            self._window.append((now, tokens))
+            self._window_tokens += tokens
+            return None, headers
+
+    def chat_completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = body["messages"][-1]["content"]
+        content = json.dumps(answer_prompt(prompt), ensure_ascii=False)
+        finish_reason = "stop"
+        if self._random() < self.malformed_rate:
+            content = content.replace(":", " =", 1)
+        if self.max_completion_tokens and len(content) > self.max_completion_tokens * 3:
+            content = content[:self.max_completion_tokens * 3]
+            finish_reason = "length"
+        prompt_tokens = self.prompt_tokens(body)
+        completion_tokens = len(content) // 3
+        
+        with self.stats.lock:
+            self.stats.completions += 1
+            self.stats.prompt_tokens += prompt_tokens
+            self.stats.completion_tokens += completion_tokens
+        
+        return {
+            "id": f"chatcmpl-fake-{self.stats.completions}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def create_file(self, filename: str, data: bytes, purpose: str) -> Dict[str, Any]:
+        with self._batch_lock:
+            file_id = f"file-fake-{len(self.files) + 1}"
+            self.files[file_id] = data
+        return {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+
+    def create_batch(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._batch_lock:
+            if body.get("input_file_id") not in self.files:
+                return None
+            batch_id = f"batch_fake_{len(self.batches) + 1}"
+            batch = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": body.get("endpoint"),
+                "input_file_id": body["input_file_id"],
+                "completion_window": body.get("completion_window", "24h"),
+                "status": "validating",
+                "created_at": int(time.time()),
+                "output_file_id": None,
+                "error_file_id": None,
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                "metadata": body.get("metadata"),
+            }
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._process_batch, args=(batch_id,), daemon=True).start()
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._batch_lock:
+            batch = self.batches.get(batch_id)
+            return dict(batch, request_counts=dict(batch["request_counts"])) if batch else None
+
+    def _process_batch(self, batch_id: str):
+        with self._batch_lock:
+            batch = self.batches[batch_id]
+            lines = [json.loads(line) for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines()
+                     if line.strip()]
+            batch["status"] = "in_progress"
+            batch["request_counts"]["total"] = len(lines)
+        
+        output, errors = [], []
+        for i, line in enumerate(lines, 1):
+            with self.stats.lock:
+                self.stats.requests += 1
+            if self._random() < self.error_rate:
+                with self.stats.lock:
+                    self.stats.errors += 1
+                errors.append({"id": f"batch_req_{i}", "custom_id": line["custom_id"], "response": None,
+                               "error": {"code": "server_error", "message": "Injected server error"}})
+            else:
+                output.append({"id": f"batch_req_{i}", "custom_id": line["custom_id"], "error": None,
+                               "response": {"status_code": 200, "request_id": f"req_{i}",
+                                            "body": self.chat_completion(line["body"])}})
+        
+        time.sleep(self.batch_duration)
+        output_file = self.create_file(
+            f"{batch_id}_output.jsonl",
+            "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in output).encode("utf-8"),
+            "batch_output"
+        ) if output else None
+        error_file = self.create_file(
+            f"{batch_id}_errors.jsonl",
+            "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in errors).encode("utf-8"),
+            "batch_output"
+        ) if errors else None
+        
+        with self._batch_lock:
+            batch["output_file_id"] = output_file["id"] if output_file else None
+            batch["error_file_id"] = error_file["id"] if error_file else None
+            batch["request_counts"].update(completed=len(output), failed=len(errors))
+            batch["status"] = "completed"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server.stats.lock:
+                    server.stats.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _upload_file(self):
+                raw = self._read_body()
+                message = BytesParser(policy=HTTP).parsebytes(
+                    f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("latin-1") + raw
+                )
+                fields = {}
+                filename = "upload.jsonl"
+                for part in message.iter_parts():
+                    name = part.get_param("name", header="content-disposition")
+                    fields[name] = part.get_payload(decode=True)
+                    filename = part.get_filename() or filename
+                if "file" not in fields:
+                    self._send_json(400, {"error": {"message": "Missing file"}})
+                    return
+                purpose = (fields.get("purpose") or b"batch").decode("utf-8")
+                self._send_json(200, server.create_file(filename, fields["file"], purpose))
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0].rstrip("/")
+                parts = path.split("/")
+                if len(parts) >= 2 and parts[-2] == "batches":
+                    batch = server.get_batch(parts[-1])
+                    if batch:
+                        self._send_json(200, batch)
+                        return
+                elif len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content":
+                    data = server.files.get(parts[-2])
+                    if data is not None:
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/octet-stream")
+                        self.send_header("Content-Length", str(len(data)))
+                        self.end_headers()
+                        self.wfile.write(data)
+                        return
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_POST(self):
+                path = self.path.split("?", 1)[0].rstrip("/")
+                if path.endswith("/files"):
+                    self._upload_file()
+                    return
+                
+                body = json.loads(self._read_body() or b"{}")
+                if path.endswith("/batches"):
+                    batch = server.create_batch(body)
+                    if batch:
+                        self._send_json(200, batch)
+                    else:
+                        self._send_json(400, {"error": {"message": "Unknown input_file_id"}})
+                    return
+                
+                with server.stats.lock:
+                    server.stats.requests += 1
+                
+                if self.path.rstrip("/").endswith("/chat/completions"):
+                    time.sleep(max(0.0, server.latency * (1 + server.jitter * (2 * server._random() - 1))))
+                    wait, headers = server.admit(server.prompt_tokens(body))
+                    roll = server._random()
+                    if wait is None and roll < server.rate_limit_rate:
+                        wait = server.retry_after
+                    if wait is not None:
+                        with server.stats.lock:
+                            server.stats.rate_limited += 1
+                        headers["retry-after-ms"] = str(int(wait * 1000))
+                        headers["Retry-After"] = str(max(1, round(wait)))
+                        self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                                        "code": "rate_limit_exceeded"}}, headers)
+                        return
+                    if roll < server.rate_limit_rate + server.error_rate:
+                        with server.stats.lock:
+                            server.stats.errors += 1
+                        self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+                        return
+                    completion = server.chat_completion(body)
+                    if server.token_latency:
+                        time.sleep(server.token_latency * completion["usage"]["completion_tokens"])
+                    self._send_json(200, completion, headers)
+                    return
+                
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+        
+        return Handler
@@ -0,0 +1,67 @@
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime, timedelta
+from models.chat import ChatSession, ChatMessage, MessageRole
+from models.compact import CompactMessage, CompactSession
+
+
+def _message_fields(i: int, base: datetime):
+    role = MessageRole.DEVELOPER if i % 3 == 0 else MessageRole.CLIENT
+    text = f"Сообщение {i}: пожалуйста, проверьте счёт и пришлите акт"
+    reply_to = i - 1 if i % 5 == 0 and i > 1 else None
+    return i, text, role, base + timedelta(seconds=i), reply_to
+
+
+def build_pydantic(n: int, with_raw_data: bool) -> ChatSession:
+    base = datetime(2024, 1, 1)
+    messages = []
+    for i in range(1, n + 1):
+        msg_id, text, role, timestamp, reply_to = _message_fields(i, base)
+        raw_data = None
+        if with_raw_data:
+            raw_data = {
+                "id": msg_id, "type": "message", "date": timestamp.isoformat(),
+                "from": role.value, "text": text, "reply_to_message_id": reply_to
+            }
+        messages.append(ChatMessage(
+            id=msg_id, text=text, role=role, timestamp=timestamp,
+            reply_to_message_id=reply_to, raw_data=raw_data
+        ))
+    session = ChatSession(chat_id="bench", source="benchmark", messages=messages, total_messages=n)
+    session.link_replies()
+    return session
+
+
+def build_compact(n: int) -> CompactSession:
+    base = datetime(2024, 1, 1)
+    messages = [CompactMessage(*_message_fields(i, base)) for i in range(1, n + 1)]
+    return CompactSession(chat_id="bench", source="benchmark", messages=messages)
+
+
+def measure(label: str, factory, n: int):
+    gc.collect()
+    tracemalloc.start()
+    session = factory()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_message = current / n
+    print(f"{label:<32} {per_message:>10.0f} Б/сообщ. {per_message * 1_000_000 / 2**20:>10.0f} МБ на 1 млн "
+          f"(пик {peak / 2**20:.0f} МБ)")
+    del session
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память на сообщение: pydantic-модели против компактного представления")
+    parser.add_argument("-n", "--messages", type=int, default=200_000)
+    args = parser.parse_args()
+    n = args.messages
+    
+    print(f"Сообщений: {n}")
+    measure("ChatMessage + raw_data", lambda: build_pydantic(n, True), n)
+    measure("ChatMessage", lambda: build_pydantic(n, False), n)
+    measure("CompactMessage", lambda: build_compact(n), n)
+
+
+if __name__ == "__main__":
+    main()
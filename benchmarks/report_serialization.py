@@ -0,0 +1,88 @@
+import argparse
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from config.settings import settings
+from models.task import Task, TaskStatus, TaskPriority
+from services.report_generator import ReportGenerator
+from services import report_writer
+
+
+STATUSES = [TaskStatus.MISSED, TaskStatus.COMPLETED, TaskStatus.COMPLETED, TaskStatus.PENDING]
+
+
+def build_tasks(n: int):
+    base = datetime(2024, 1, 1)
+    return [
+        Task(
+            id=f"bench_{i}_{i}",
+            description=f"Исправьте ошибку в форме оплаты №{i}, клиенты жалуются",
+            source_message_id=i,
+            source_message_text=f"Добрый день! Исправьте, пожалуйста, ошибку в форме оплаты №{i}",
+            status=STATUSES[i % len(STATUSES)],
+            priority=TaskPriority.HIGH,
+            requested_at=base + timedelta(minutes=i),
+            context="Клиент сообщает, что оплата не проходит",
+            missed_reason="Нет ответов после запроса" if i % len(STATUSES) == 0 else None
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def save_legacy(generator: ReportGenerator, report) -> Path:
+    filepath = generator.reports_path / "legacy.json"
+    data = report.model_dump(mode='json')
+    data["missed_tasks"] = [t.model_dump(mode='json') for t in report.missed_tasks]
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    return filepath
+
+
+def measure(label: str, save, tasks):
+    generator = ReportGenerator()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    report = generator.generate("bench", "Бенчмарк", tasks)
+    filepath = save(generator, report)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:>7.2f} с   пик {peak / 2**20:>7.1f} МБ   файл {filepath.stat().st_size / 2**20:>7.1f} МБ")
+
+
+def configured(report_format: str, compression=None, backend: str = "auto"):
+    def save(generator: ReportGenerator, report) -> Path:
+        settings.report_format = report_format
+        settings.report_compression = compression
+        settings.report_json_backend = backend
+        return generator.save_json(report)
+    return save
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость и память записи JSON-отчетов")
+    parser.add_argument("-n", "--tasks", type=int, default=100_000)
+    args = parser.parse_args()
+    
+    settings.reports_path = Path(tempfile.mkdtemp(prefix="report_bench_"))
+    tasks = build_tasks(args.tasks)
+    print(f"Задач: {args.tasks}, orjson: {'да' if report_writer.orjson else 'нет'}, каталог: {settings.reports_path}")
+    
+    measure("model_dump + indent=2", save_legacy, tasks)
+    measure("json (pydantic)", configured("json", backend="json"), tasks)
+    measure("json (auto)", configured("json"), tasks)
+    measure("ndjson (auto)", configured("ndjson"), tasks)
+    measure("json + gzip", configured("json", "gzip"), tasks)
+    try:
+        measure("json + zstd", configured("json", "zstd"), tasks)
+    except RuntimeError as e:
+        print(f"json + zstd: {e}")
+
+
+if __name__ == "__main__":
+    main()
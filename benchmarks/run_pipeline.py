@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from config.settings import settings
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from benchmarks.synthetic import generate_session
+from services.metrics import MetricsCollector
+from services.openai_client import OpenAIClient
+from services.openai_batch import BatchOpenAIClient, BatchJobStore
+from services.rate_limiter import RateController
+from services.task_extractor import TaskExtractor
+from services.task_matcher import TaskMatcher
+from services.analysis_pipeline import AnalysisPipeline
+from services.task_dedup import TaskDeduplicator
+
+
+async def run_pipeline(session, batch_api: bool = False, sequential: bool = False) -> dict:
+    rate_controller = RateController()
+    if batch_api:
+        ai_client = BatchOpenAIClient(rate_controller, BatchJobStore(Path(tempfile.mkdtemp()) / "batch_jobs.json"),
+                                      poll_interval=0.1, collect_delay=0.2)
+    else:
+        ai_client = OpenAIClient(rate_controller)
+    metrics = MetricsCollector()
+    
+    async with ai_client:
+        if sequential:
+            with metrics.stage("extraction"):
+                tasks = await TaskExtractor(ai_client).extract_tasks(session)
+                if settings.task_dedup_enabled:
+                    tasks = TaskDeduplicator().add(tasks)
+            
+            with metrics.stage("matching"):
+                if tasks:
+                    tasks = await TaskMatcher(ai_client).match_tasks_with_responses(session, tasks)
+        else:
+            deduplicator = TaskDeduplicator() if settings.task_dedup_enabled else None
+            pipeline = AnalysisPipeline(TaskExtractor(ai_client), TaskMatcher(ai_client), deduplicator)
+            tasks = await pipeline.run(session, metrics=metrics)
+    
+    completed = sum(1 for t in tasks if t.status.value == "completed")
+    statuses = [(t.id, t.status.value) for t in tasks]
+    return {"metrics": metrics.to_model().model_dump(), "tasks": len(tasks), "completed": completed, "statuses": statuses,
+            "final_concurrency": rate_controller.concurrency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк TaskExtractor/TaskMatcher на синтетическом чате и локальном OpenAI-сервере")
+    parser.add_argument("-n", "--messages", type=int, default=5000)
+    parser.add_argument("--client-ratio", type=float, default=0.5)
+    parser.add_argument("--task-ratio", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.2, help="средняя задержка ответа, с")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="дополнительная задержка на токен ответа, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="доля ответов с некорректным JSON")
+    parser.add_argument("--max-completion-tokens", type=int, help="обрезать ответы сервера до N токенов")
+    parser.add_argument("--concurrency", type=int, default=settings.max_concurrent_requests, help="начальная параллельность")
+    parser.add_argument("--max-concurrency", type=int, default=settings.openai_max_concurrency)
+    parser.add_argument("--server-rpm", type=int, help="лимит запросов в минуту на сервере")
+    parser.add_argument("--server-tpm", type=int, help="лимит токенов в минуту на сервере")
+    parser.add_argument("--cache", action="store_true", help="использовать кэш ответов LLM")
+    parser.add_argument("--batch-api", action="store_true", help="отправлять запросы через Batch API")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="доля повторных запросов клиента")
+    parser.add_argument("--no-dedup", action="store_true", help="не объединять повторные задачи")
+    parser.add_argument("--no-retrieval", action="store_true", help="брать ответы подряд, без отбора по TF-IDF")
+    parser.add_argument("--sequential", action="store_true", help="сопоставлять задачи только после извлечения всех частей")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=Path, help="сохранить результат в JSON для сравнения")
+    parser.add_argument("-v", "--verbose", action="store_true", help="показывать вывод пайплайна")
+    args = parser.parse_args()
+    
+    settings.openai_api_key = "benchmark"
+    settings.llm_cache_enabled = args.cache
+    settings.response_retrieval_enabled = not args.no_retrieval
+    settings.task_dedup_enabled = not args.no_dedup
+    settings.max_concurrent_requests = args.concurrency
+    settings.openai_max_concurrency = args.max_concurrency
+    
+    session = generate_session(args.messages, args.client_ratio, args.task_ratio, seed=args.seed,
+                               repeat_ratio=args.repeat_ratio)
+    
+    with FakeOpenAIServer(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                          retry_after=args.retry_after, seed=args.seed, requests_per_minute=args.server_rpm,
+                          tokens_per_minute=args.server_tpm, malformed_rate=args.malformed_rate,
+                          max_completion_tokens=args.max_completion_tokens, token_latency=args.token_latency) as server:
+        settings.openai_base_url = server.base_url
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        
+        tracemalloc.start()
+        started = time.perf_counter()
+        with output:
+            result = asyncio.run(run_pipeline(session, args.batch_api, args.sequential))
+        wall_time = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        stats = server.stats.as_dict()
+    
+    result.update({
+        "messages": args.messages,
+        "concurrency": args.concurrency,
+        "wall_time": wall_time,
+        "peak_memory_mb": peak / 2**20,
+        "calls_per_sec": stats["requests"] / wall_time if wall_time else 0.0,
+        "server": stats,
+    })
+    
+    print(f"Сообщений: {args.messages}, параллельность: {args.concurrency} (итоговая {result['final_concurrency']:.1f}), "
+          f"задержка: {args.latency} с")
+    stages = {stage["name"]: stage for stage in result["metrics"]["stages"]}
+    print(f"Время: {wall_time:.2f} с (извлечение {stages['extraction']['wall_time']:.2f} с, "
+          f"сопоставление {stages['matching']['wall_time']:.2f} с)")
+    print(f"Запросов: {stats['requests']} (успешных {stats['completions']}, 429: {stats['rate_limited']}, "
+          f"ошибок: {stats['errors']}), {result['calls_per_sec']:.1f} запр/с, соединений: {stats['connections']}")
+    print(f"Токены: prompt {stats['prompt_tokens']}, completion {stats['completion_tokens']}, "
+          f"оценка стоимости ${result['metrics']['cost_usd']:.4f}, повторов {result['metrics']['retries']}")
+    print(f"Некорректных ответов: {result['metrics']['parse_failures']}, повторных запросов: {result['metrics']['reasks']}, "
+          f"делений частей: {result['metrics']['bisections']}")
+    matching = stages["matching"]
+    print(f"Сопоставление: запросов {matching['llm_calls']}, prompt-токенов {matching['prompt_tokens']} "
+          f"({matching['prompt_tokens'] / max(1, matching['llm_calls']):.0f} на запрос)")
+    print(f"Пиковая память: {result['peak_memory_mb']:.1f} МБ")
+    print(f"Задач: {result['tasks']}, выполнено: {result['completed']}")
+    
+    if args.json:
+        args.json.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import random
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional
+from models.chat import MessageRole
+from models.compact import CompactMessage, CompactSession
+
+
+TASK_TEMPLATES = [
+    "Пришлите, пожалуйста, счёт №{n} за этот месяц",
+    "Сделайте кнопку заказа заметнее на странице №{n}",
+    "Исправьте ошибку в форме оплаты №{n}, клиенты жалуются",
+    "Добавьте, пожалуйста, новый раздел в каталог №{n}",
+    "Можете перенести созвон по задаче №{n} на завтра?",
+    "Please fix the login redirect for ticket №{n}",
+]
+
+NOISE_TEMPLATES = [
+    "ок", "спасибо", "хорошо", "понял", "👍", "Добрый день!", "да", "отлично, жду",
+    "thanks", "завтра буду в офисе", "сегодня на созвоне не смогу",
+]
+
+DONE_TEMPLATES = [
+    "Готово, по задаче №{n} всё сделали",
+    "Сделали задачу №{n}, проверьте",
+    "Done, ticket №{n} is deployed",
+]
+
+CHATTER_TEMPLATES = [
+    "Принял, посмотрю", "Сейчас уточню у команды", "Добрый день!", "Работаем над этим",
+    "Ок, понял", "Созвонимся после обеда",
+]
+
+
+def generate_session(messages: int, client_ratio: float = 0.5, task_ratio: float = 0.3,
+                     completion_ratio: float = 0.6, seed: int = 42,
+                     chat_id: Optional[str] = None, repeat_ratio: float = 0.0) -> CompactSession:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 9, 0)
+    result = []
+    open_tasks = []
+    recent_requests = deque(maxlen=20)
+    task_number = 0
+    
+    for i in range(1, messages + 1):
+        timestamp = start + timedelta(minutes=7 * i)
+        if rng.random() < client_ratio:
+            if repeat_ratio and recent_requests and rng.random() < repeat_ratio:
+                text = "Напоминаю: " + rng.choice(recent_requests)
+            elif rng.random() < task_ratio:
+                task_number += 1
+                text = rng.choice(TASK_TEMPLATES).format(n=task_number)
+                recent_requests.append(text)
+                if rng.random() < completion_ratio:
+                    open_tasks.append(task_number)
+            else:
+                text = rng.choice(NOISE_TEMPLATES)
+            result.append(CompactMessage(i, text, MessageRole.CLIENT, timestamp))
+        else:
+            if open_tasks and rng.random() < 0.5:
+                text = rng.choice(DONE_TEMPLATES).format(n=open_tasks.pop(0))
+            else:
+                text = rng.choice(CHATTER_TEMPLATES)
+            result.append(CompactMessage(i, text, MessageRole.DEVELOPER, timestamp))
+    
+    return CompactSession(
+        chat_id=chat_id or f"synthetic_{messages}",
+        chat_title=f"Синтетический чат ({messages} сообщений)",
+        source="synthetic",
+        messages=result
+    )
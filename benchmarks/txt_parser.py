@@ -0,0 +1,97 @@
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from models.chat import MessageRole
+from models.compact import CompactMessage
+from services.chat_parser import ChatParser
+
+
+LINES = [
+    "Добрый день! Исправьте, пожалуйста, ошибку в форме оплаты №{i}",
+    "Клиенты жалуются, что после ввода карты страница зависает.",
+    "Скриншот и логи приложил выше, проверьте еще раз на мобильной версии.",
+]
+
+
+def write_transcript(path: Path, size_mb: int) -> int:
+    base = datetime(2024, 1, 1)
+    limit = size_mb * 2**20
+    written = 0
+    i = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < limit:
+            i += 1
+            speaker = "Разработчик" if i % 3 == 0 else "Клиент"
+            stamp = (base + timedelta(seconds=30 * i)).strftime("%Y-%m-%d %H:%M:%S")
+            lines = [line.format(i=i) for line in LINES[:1 + i % len(LINES)]]
+            block = f"[{stamp}] {speaker}: " + "\n".join(lines) + "\n"
+            f.write(block)
+            written += len(block.encode('utf-8'))
+    return i
+
+
+def parse_legacy(path: Path):
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    
+    messages_list = []
+    current_role = MessageRole.UNKNOWN
+    for i, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("Клиент:") or line.startswith("Client:"):
+            current_role = MessageRole.CLIENT
+            text = line.split(":", 1)[1].strip()
+        elif line.startswith("Разработчик:") or line.startswith("Developer:"):
+            current_role = MessageRole.DEVELOPER
+            text = line.split(":", 1)[1].strip()
+        else:
+            text = line
+        if text:
+            messages_list.append(CompactMessage(i, text, current_role, datetime.now()))
+    return messages_list
+
+
+def measure(label: str, parse, path: Path, memory: bool):
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    messages = parse(path)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if memory else 0
+    if memory:
+        tracemalloc.stop()
+    size = path.stat().st_size / 2**20
+    line = f"{label:<20} {elapsed:>7.2f} с   {size / elapsed:>7.1f} МБ/с   сообщений {len(messages):>9}"
+    if memory:
+        line += f"   пик {peak / 2**20:>7.1f} МБ"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость разбора больших TXT-переписок")
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--file", type=Path, help="готовая переписка вместо синтетической")
+    parser.add_argument("--memory", action="store_true", help="измерять пиковую память (заметно медленнее)")
+    args = parser.parse_args()
+    
+    path = args.file
+    if path is None:
+        path = Path(tempfile.mkdtemp(prefix="txt_bench_")) / "transcript.txt"
+        blocks = write_transcript(path, args.size_mb)
+        print(f"Синтетическая переписка: {path}, реплик {blocks}")
+    print(f"Размер: {path.stat().st_size / 2**20:.1f} МБ")
+    
+    measure("readlines (старый)", parse_legacy, path, args.memory)
+    measure("потоковый", lambda p: ChatParser.parse_txt(p, compact=True, use_mmap=False).messages, path, args.memory)
+    measure("потоковый + mmap", lambda p: ChatParser.parse_txt(p, compact=True, use_mmap=True).messages, path, args.memory)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,23 @@ from typing import Optional
 class Settings(BaseSettings):
     openai_api_key: Optional[str] = None
     openai_model: str = "gpt-4o-mini"
+    openai_base_url: Optional[str] = None
+    openai_input_price_per_1m: float = 0.15
+    openai_output_price_per_1m: float = 0.60
+    openai_requests_per_minute: Optional[int] = None
+    openai_tokens_per_minute: Optional[int] = None
+    openai_rate_limit_headroom: float = 0.9
+    openai_max_concurrency: int = 16
+    openai_timeout: float = 300.0
+    openai_connect_timeout: float = 10.0
+    openai_keepalive_expiry: float = 60.0
+    openai_structured_output: bool = True
+    openai_max_reasks: int = 2
+    openai_batch_completion_window: str = "24h"
+    openai_batch_poll_seconds: float = 30.0
+    openai_batch_collect_seconds: float = 1.0
+    openai_batch_max_requests: int = 50000
+    openai_batch_price_factor: float = 0.5
     
     telegram_api_id: Optional[str] = None
     telegram_api_hash: Optional[str] = None
@@ -14,9 +31,46 @@ class Settings(BaseSettings):
     telegram_session_name: str = "telegram_session"
     
     reports_path: Path = Path("reports")
+    state_path: Path = Path("state")
+    metrics_textfile_path: Optional[Path] = None
+    report_format: str = "json"
+    report_compression: Optional[str] = None
+    report_json_backend: str = "auto"
     
     chunk_size: int = 5000
+    chunk_overlap: int = 3
+    prefilter_enabled: bool = True
+    prefilter_threshold: float = 0.35
+    prefilter_recall_margin: float = 0.1
     max_concurrent_requests: int = 3
+    match_batch_size: int = 8
+    match_batch_max_responses: int = 30
+    response_window_messages: int = 10
+    response_window_hours: Optional[float] = None
+    response_retrieval_enabled: bool = True
+    response_search_messages: int = 50
+    response_recent_messages: int = 3
+    response_top_k: int = 3
+    task_dedup_enabled: bool = True
+    task_dedup_threshold: float = 0.6
+    task_dedup_window_hours: Optional[float] = 168.0
+    pipeline_queue_size: int = 8
+    pipeline_match_workers: int = 4
+    batch_max_concurrent_chats: int = 4
+    parse_workers: Optional[int] = None
+    parse_prefetch_files: Optional[int] = None
+    txt_parser_mmap: bool = False
+    txt_timestamp_lookahead_lines: int = 1000
+    
+    llm_cache_enabled: bool = True
+    llm_cache_bypass: bool = False
+    llm_cache_path: Path = Path(".cache/llm_cache.sqlite3")
+    llm_cache_max_entries: Optional[int] = 50000
+    llm_cache_max_age_days: Optional[float] = 30
+    
+    message_store_enabled: bool = True
+    message_store_path: Path = Path(".cache/messages.sqlite3")
+    message_store_batch_size: int = 500
     
     class Config:
         env_file = ".env"
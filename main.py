@@ -1,15 +1,28 @@
 import asyncio
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 from services.telegram_client import TelegramImporter
 from services.chat_parser import ChatParser
+from services.parallel_parser import ParseStats, expand_paths, is_pattern, iter_parsed_files, unique_chat_ids
 from services.task_extractor import TaskExtractor
 from services.task_matcher import TaskMatcher
+from services.analysis_pipeline import AnalysisPipeline
+from services.task_dedup import TaskDeduplicator
 from services.report_generator import ReportGenerator
+from services.openai_client import OpenAIClient
+from services.openai_batch import BatchOpenAIClient
+from services.llm_cache import get_llm_cache
+from services.analysis_state import AnalysisStateStore
+from services.metrics import MetricsCollector, publish as publish_metrics
+from models.analysis_state import ChatAnalysisState
+from models.task import TaskStatus
+from models.report import AnalysisReport, BatchChatResult
+from config.settings import settings
 
 
-async def import_from_telegram_api(chat_id: Optional[int] = None, username: Optional[str] = None) -> Optional[object]:
+async def import_from_telegram_api(chat_id: Optional[int] = None, username: Optional[str] = None,
+                                   incremental: bool = False) -> Optional[object]:
     importer = TelegramImporter()
     try:
         print("Подключение к Telegram...")
@@ -18,50 +31,69 @@ async def import_from_telegram_api(chat_id: Optional[int] = None, username: Opti
             print("Проверьте TELEGRAM_API_ID и TELEGRAM_API_HASH в .env")
             return None
         
-        if username:
-            print(f"Поиск чата по username: @{username}...")
-            found_chat_id = await importer.find_chat_by_username(username)
-            if not found_chat_id:
-                print(f"Чат с username @{username} не найден")
-                print("Попытка поиска по частичному совпадению...")
-                results = await importer.search_chats_by_username(username)
-                if results:
-                    print("\nНайдены похожие чаты:")
-                    for i, chat in enumerate(results, 1):
-                        print(f"  {i}. @{chat.get('username', 'N/A')} - {chat['title']} (ID: {chat['id']})")
-                    print("\nИспользуется первый найденный чат.")
-                    found_chat_id = results[0]['id']
-                else:
-                    return None
-            chat_id = found_chat_id
-        
-        if not chat_id:
-            print("Ошибка: не указан chat_id или username")
-            return None
-        
-        print(f"Импорт чата (ID: {chat_id})...")
-        session = await importer.import_chat(chat_id)
-        print(f"Импортировано сообщений: {session.total_messages}")
-        return session
+        return await import_with_importer(importer, chat_id, username, incremental)
     finally:
         await importer.disconnect()
 
 
+async def import_with_importer(importer: TelegramImporter, chat_id: Optional[int] = None,
+                               username: Optional[str] = None, incremental: bool = False) -> Optional[object]:
+    if username:
+        print(f"Поиск чата по username: @{username}...")
+        found_chat_id = await importer.find_chat_by_username(username)
+        if not found_chat_id:
+            print(f"Чат с username @{username} не найден")
+            print("Попытка поиска по частичному совпадению...")
+            results = await importer.search_chats_by_username(username)
+            if results:
+                print("\nНайдены похожие чаты:")
+                for i, chat in enumerate(results, 1):
+                    print(f"  {i}. @{chat.get('username', 'N/A')} - {chat['title']} (ID: {chat['id']})")
+                print("\nИспользуется первый найденный чат.")
+                found_chat_id = results[0]['id']
+            else:
+                return None
+        chat_id = found_chat_id
+    
+    if not chat_id:
+        print("Ошибка: не указан chat_id или username")
+        return None
+    
+    min_id = None
+    if incremental:
+        state = AnalysisStateStore().load(str(chat_id))
+        if state:
+            min_id = state.last_message_id
+            print(f"Инкрементальный импорт: сообщения после #{min_id}")
+    
+    print(f"Импорт чата (ID: {chat_id})...")
+    session = await importer.import_chat(chat_id, min_id=min_id, compact=True)
+    print(f"Импортировано сообщений: {session.total_messages}")
+    return session
+
+
 def import_from_file(file_path: Path) -> Optional[object]:
     parser = ChatParser()
     
     if file_path.suffix == ".json":
         print("Парсинг JSON экспорта Telegram...")
-        return parser.parse_telegram_export(file_path)
+        return parser.parse_telegram_export(file_path, compact=True)
     elif file_path.suffix == ".txt":
         print("Парсинг TXT файла...")
-        return parser.parse_txt(file_path)
+        return parser.parse_txt(file_path, compact=True)
     else:
         print(f"Неподдерживаемый формат: {file_path.suffix}")
         return None
 
 
-async def analyze_chat(session):
+async def analyze_chat(session, incremental: bool = False, ai_client: Optional[OpenAIClient] = None,
+                       metrics: Optional[MetricsCollector] = None) -> Optional[AnalysisReport]:
+    if ai_client is None:
+        async with OpenAIClient() as ai_client:
+            return await analyze_chat(session, incremental, ai_client, metrics)
+    
+    metrics = metrics or MetricsCollector()
+    
     print("\n" + "=" * 80)
     print("АНАЛИЗ ЧАТА")
     print("=" * 80)
@@ -70,18 +102,42 @@ async def analyze_chat(session):
     print(f"Сообщений: {session.total_messages}")
     print(f"Источник: {session.source}\n")
     
-    print("Извлечение задач...")
-    extractor = TaskExtractor()
-    tasks = await extractor.extract_tasks(session)
-    print(f"Найдено задач: {len(tasks)}\n")
+    state_store = AnalysisStateStore()
+    state = state_store.load(session.chat_id) if incremental else None
+    watermark = state.last_message_id if state else None
+    if state:
+        print(f"Инкрементальный анализ: сообщения после #{watermark}, ранее найдено задач: {len(state.tasks)}\n")
+    
+    print("Извлечение и сопоставление задач...")
+    extractor = TaskExtractor(ai_client)
+    matcher = TaskMatcher(ai_client)
+    deduplicator = None
+    if settings.task_dedup_enabled:
+        deduplicator = TaskDeduplicator()
+        if state:
+            deduplicator.register(t for t in state.tasks if t.status in (TaskStatus.MISSED, TaskStatus.PENDING))
+    tasks = await AnalysisPipeline(extractor, matcher, deduplicator).run(session, watermark, metrics)
+    print(f"Найдено и проверено задач: {len(tasks)}\n")
+    
+    if state:
+        with metrics.stage("matching"):
+            previous_tasks = await matcher.recheck_open_tasks(session, state.tasks, watermark)
+        tasks = previous_tasks + tasks
+    
+    last_message_id = session.last_message_id
+    if watermark is not None and (last_message_id is None or last_message_id < watermark):
+        last_message_id = watermark
+    state_store.save(ChatAnalysisState(
+        chat_id=session.chat_id,
+        chat_title=session.chat_title,
+        last_message_id=last_message_id or 0,
+        tasks=tasks
+    ))
     
     if not tasks:
         print("Задачи не найдены.")
-        return
-    
-    print("Сопоставление задач с ответами...")
-    matcher = TaskMatcher()
-    tasks = await matcher.match_tasks_with_responses(session, tasks)
+        print_run_metrics(session.chat_id, metrics)
+        return None
     
     completed = sum(1 for t in tasks if t.status.value == "completed")
     missed = sum(1 for t in tasks if t.status.value == "missed")
@@ -90,11 +146,12 @@ async def analyze_chat(session):
     print(f"Пропущено: {missed}\n")
     
     print("Генерация отчета...")
-    generator = ReportGenerator()
-    report = generator.generate(session.chat_id, session.chat_title, tasks)
-    
-    json_path = generator.save_json(report)
-    txt_path = generator.save_txt(report)
+    with metrics.stage("report"):
+        generator = ReportGenerator()
+        report = generator.generate(session.chat_id, session.chat_title, tasks)
+        txt_path = generator.save_txt(report)
+        report.metrics = metrics.to_model()
+        json_path = generator.save_json(report)
     
     print("\n" + "=" * 80)
     print("ОТЧЕТ СОЗДАН")
@@ -107,6 +164,175 @@ async def analyze_chat(session):
     print(f"  Пропущено: {report.summary.missed_tasks}")
     print(f"  В процессе: {report.summary.in_progress_tasks}")
     print(f"  Ожидают: {report.summary.pending_tasks}")
+    print_run_metrics(session.chat_id, metrics)
+    
+    return report
+
+
+def print_run_metrics(chat_id: str, metrics: MetricsCollector):
+    run = metrics.to_model()
+    print("\nЗатраты:")
+    for stage in run.stages:
+        print(f"  {stage.name}: {stage.wall_time:.2f} с, запросов {stage.llm_calls} "
+              f"(из кэша {stage.cache_hits}, повторов {stage.retries}, ошибок {stage.errors}), "
+              f"токенов {stage.prompt_tokens}+{stage.completion_tokens}, ${stage.cost_usd:.4f}")
+    print(f"  Итого: {run.wall_time:.2f} с, запросов {run.llm_calls}, "
+          f"токенов {run.prompt_tokens}+{run.completion_tokens}, ${run.cost_usd:.4f}")
+    if run.parse_failures or run.bisections:
+        failure_rate = run.parse_failures / run.llm_calls if run.llm_calls else 0.0
+        print(f"  Некорректных ответов: {run.parse_failures} ({failure_rate:.1%}), повторных запросов: {run.reasks}, "
+              f"делений частей: {run.bisections}")
+    
+    metrics_path = publish_metrics(chat_id, run)
+    if metrics_path:
+        print(f"  Метрики: {metrics_path}")
+
+
+def expand_identifiers(identifiers: List[str]) -> List[str]:
+    expanded = []
+    for identifier in identifiers:
+        if Path(identifier).is_dir() or (is_pattern(identifier) and not Path(identifier).exists()):
+            paths = expand_paths(identifier)
+            if not paths:
+                print(f"Файлы не найдены: {identifier}")
+            expanded.extend(str(path) for path in paths)
+        else:
+            expanded.append(identifier)
+    return list(dict.fromkeys(expanded))
+
+
+def resolve_identifier(identifier: str):
+    file_path = Path(identifier)
+    if file_path.exists():
+        return "file", file_path
+    if identifier.lstrip('-').isdigit():
+        return "chat_id", int(identifier)
+    return "username", identifier.lstrip('@')
+
+
+async def analyze_batch(identifiers: List[str], incremental: bool = False, ai_client: Optional[OpenAIClient] = None):
+    if ai_client is None:
+        async with OpenAIClient() as ai_client:
+            return await analyze_batch(identifiers, incremental, ai_client)
+    
+    identifiers = expand_identifiers(identifiers)
+    print(f"Пакетный анализ: чатов {len(identifiers)}, одновременно {settings.batch_max_concurrent_chats}")
+    
+    resolved = [(identifier, *resolve_identifier(identifier)) for identifier in identifiers]
+    
+    importer = None
+    if any(kind != "file" for _, kind, _ in resolved):
+        importer = TelegramImporter()
+        print("Подключение к Telegram...")
+        if not await importer.connect():
+            print("Ошибка: не удалось подключиться к Telegram, чаты из Telegram будут пропущены")
+            importer = None
+    
+    chat_semaphore = asyncio.Semaphore(settings.batch_max_concurrent_chats)
+    results: List[Optional[BatchChatResult]] = [None] * len(resolved)
+    
+    async def analyze(index: int, identifier: str, session, metrics: MetricsCollector):
+        try:
+            report = await analyze_chat(session, incremental, ai_client, metrics)
+            results[index] = BatchChatResult(
+                identifier=identifier,
+                chat_id=session.chat_id,
+                chat_title=session.chat_title,
+                summary=report.summary if report else None
+            )
+        except Exception as e:
+            print(f"Ошибка анализа {identifier}: {e}")
+            results[index] = BatchChatResult(identifier=identifier, error=str(e))
+    
+    async def process(index: int, identifier: str, kind: str, value):
+        async with chat_semaphore:
+            metrics = MetricsCollector()
+            try:
+                with metrics.stage("import"):
+                    if importer is None:
+                        results[index] = BatchChatResult(identifier=identifier, error="Нет подключения к Telegram")
+                        return
+                    elif kind == "chat_id":
+                        session = await import_with_importer(importer, chat_id=value, incremental=incremental)
+                    else:
+                        session = await import_with_importer(importer, username=value, incremental=incremental)
+            except Exception as e:
+                print(f"Ошибка импорта {identifier}: {e}")
+                results[index] = BatchChatResult(identifier=identifier, error=str(e))
+                return
+            
+            if not session:
+                results[index] = BatchChatResult(identifier=identifier, error="Не удалось импортировать чат")
+                return
+            
+            await analyze(index, identifier, session, metrics)
+    
+    async def process_files(files: List[Tuple[int, str, Path]]):
+        if not files:
+            return
+        
+        positions = {path: (index, identifier) for index, identifier, path in files}
+        chat_ids = unique_chat_ids(positions)
+        stats = ParseStats()
+        running = []
+        
+        async def analyze_parsed(index: int, identifier: str, session, metrics: MetricsCollector):
+            try:
+                await analyze(index, identifier, session, metrics)
+            finally:
+                chat_semaphore.release()
+        
+        print(f"Разбор файлов: {len(positions)}")
+        async for path, session, elapsed, error in iter_parsed_files(positions, stats):
+            index, identifier = positions[path]
+            if error:
+                print(f"Ошибка разбора {identifier}: {error}")
+                results[index] = BatchChatResult(identifier=identifier, error=str(error))
+                continue
+            
+            session.chat_id = chat_ids[path]
+            metrics = MetricsCollector()
+            metrics.add_stage_time("import", elapsed)
+            await chat_semaphore.acquire()
+            running.append(asyncio.create_task(analyze_parsed(index, identifier, session, metrics)))
+        
+        print(stats.summary())
+        await asyncio.gather(*running)
+    
+    files = [(index, identifier, value) for index, (identifier, kind, value) in enumerate(resolved) if kind == "file"]
+    try:
+        await asyncio.gather(
+            process_files(files),
+            *(process(index, *item) for index, item in enumerate(resolved) if item[1] != "file")
+        )
+    finally:
+        if importer:
+            await importer.disconnect()
+    
+    results = [result for result in results if result is not None]
+    
+    generator = ReportGenerator()
+    summary = generator.generate_batch_summary(results)
+    json_path = generator.save_batch_summary_json(summary)
+    txt_path = generator.save_batch_summary_txt(summary)
+    
+    failed = sum(1 for r in results if r.error)
+    print("\n" + "=" * 80)
+    print("СВОДНЫЙ ОТЧЕТ СОЗДАН")
+    print("=" * 80)
+    print(f"JSON: {json_path}")
+    print(f"TXT: {txt_path}")
+    print(f"\nЧатов: {len(results)}, с ошибками: {failed}")
+    print(f"  Всего задач: {summary.total.total_tasks}")
+    print(f"  Выполнено: {summary.total.completed_tasks}")
+    print(f"  Пропущено: {summary.total.missed_tasks}")
+
+
+def print_cache_stats():
+    cache = get_llm_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"\nКэш LLM: попаданий {stats['hits']}, промахов {stats['misses']}")
 
 
 async def main():
@@ -115,11 +341,27 @@ async def main():
     print("=" * 80)
     print()
     
-    if len(sys.argv) < 2:
+    flags = {arg for arg in sys.argv[1:] if arg.startswith("--")}
+    argv = [arg for arg in sys.argv if not arg.startswith("--")]
+    
+    if "--no-cache" in flags:
+        settings.llm_cache_bypass = True
+    incremental = "--incremental" in flags
+    client_class = BatchOpenAIClient if "--batch-api" in flags else OpenAIClient
+    
+    if len(argv) < 2:
         print("Использование:")
         print("  python main.py telegram <chat_id>     - импорт из Telegram API по ID")
         print("  python main.py telegram @username     - импорт из Telegram API по username")
         print("  python main.py file <путь_к_файлу>     - импорт из файла (.json, .txt)")
+        print("  python main.py file <каталог|маска>    - параллельный разбор и анализ всех файлов (.json, .txt)")
+        print("  python main.py batch <чат> [<чат> ...] - пакетный анализ чатов (ID, @username или файлы)")
+        print()
+        print("Флаги:")
+        print("  --no-cache                            - не использовать кэш ответов LLM (ответы обновляются)")
+        print("  --incremental                         - анализировать только новые сообщения с прошлого запуска")
+        print("  --list=<файл>                         - список чатов для batch, по одному в строке")
+        print("  --batch-api                           - отправлять запросы через OpenAI Batch API (дешевле, но медленнее)")
         print()
         print("Примеры:")
         print("  python main.py telegram 123456789")
@@ -127,24 +369,30 @@ async def main():
         print("  python main.py telegram username")
         print("  python main.py file chat_export.json")
         print("  python main.py file conversation.txt")
+        print("  python main.py file exports/")
+        print("  python main.py file 'exports/**/*.json'")
+        print("  python main.py batch 123456789 @client_chat export.json --list=chats.txt")
         sys.exit(1)
     
-    source_type = sys.argv[1].lower()
+    source_type = argv[1].lower()
+    metrics = MetricsCollector()
     
     if source_type == "telegram":
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print("Ошибка: укажите chat_id или username")
             sys.exit(1)
         
-        identifier = sys.argv[2]
+        identifier = argv[2]
         
         if identifier.startswith('@') or not identifier.isdigit():
             username = identifier.lstrip('@')
-            session = await import_from_telegram_api(username=username)
+            with metrics.stage("import"):
+                session = await import_from_telegram_api(username=username, incremental=incremental)
         else:
             try:
                 chat_id = int(identifier)
-                session = await import_from_telegram_api(chat_id=chat_id)
+                with metrics.stage("import"):
+                    session = await import_from_telegram_api(chat_id=chat_id, incremental=incremental)
             except ValueError:
                 print("Ошибка: chat_id должен быть числом, или используйте @username")
                 sys.exit(1)
@@ -152,26 +400,55 @@ async def main():
         if not session:
             sys.exit(1)
     
+    elif source_type == "batch":
+        identifiers = argv[2:]
+        list_path = next((flag.split("=", 1)[1] for flag in flags if flag.startswith("--list=")), None)
+        if list_path:
+            with open(list_path, 'r', encoding='utf-8') as f:
+                identifiers += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        
+        if not identifiers:
+            print("Ошибка: укажите chat_id, username или файлы для пакетного анализа")
+            sys.exit(1)
+        
+        async with client_class() as ai_client:
+            await analyze_batch(identifiers, incremental=incremental, ai_client=ai_client)
+        print_cache_stats()
+        return
+    
     elif source_type == "file":
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print("Ошибка: укажите путь к файлу")
             sys.exit(1)
         
-        file_path = Path(sys.argv[2])
+        paths = expand_identifiers(argv[2:])
+        if not paths:
+            sys.exit(1)
+        
+        if len(paths) > 1:
+            async with client_class() as ai_client:
+                await analyze_batch(paths, incremental=incremental, ai_client=ai_client)
+            print_cache_stats()
+            return
+        
+        file_path = Path(paths[0])
         if not file_path.exists():
             print(f"Ошибка: файл не найден: {file_path}")
             sys.exit(1)
         
-        session = import_from_file(file_path)
+        with metrics.stage("import"):
+            session = import_from_file(file_path)
         if not session:
             sys.exit(1)
     
     else:
         print(f"Ошибка: неизвестный тип источника: {source_type}")
-        print("Используйте 'telegram' или 'file'")
+        print("Используйте 'telegram', 'file' или 'batch'")
         sys.exit(1)
     
-    await analyze_chat(session)
+    async with client_class() as ai_client:
+        await analyze_chat(session, incremental=incremental, ai_client=ai_client, metrics=metrics)
+    print_cache_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+from models.task import Task
+
+
+class ChatAnalysisState(BaseModel):
+    chat_id: str
+    chat_title: Optional[str] = None
+    last_message_id: int = 0
+    updated_at: datetime = Field(default_factory=datetime.now)
+    tasks: List[Task] = Field(default_factory=list)
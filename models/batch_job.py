@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+
+
+class BatchJob(BaseModel):
+    batch_id: str
+    input_file_id: str
+    custom_ids: List[str] = Field(default_factory=list)
+    status: str = "validating"
+    submitted_at: datetime = Field(default_factory=datetime.now)
+
+
+class BatchJobState(BaseModel):
+    jobs: List[BatchJob] = Field(default_factory=list)
+    updated_at: Optional[datetime] = None
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field
+from bisect import bisect_right
+from pydantic import BaseModel, Field, PrivateAttr
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, Sequence
 from enum import Enum
 
 
@@ -17,11 +18,72 @@ class ChatMessage(BaseModel):
     role: MessageRole
     timestamp: datetime
     reply_to_message_id: Optional[int] = None
-    reply_to_message: Optional['ChatMessage'] = None
+    reply_to_message: Optional['ChatMessage'] = Field(default=None, exclude=True)
     raw_data: Optional[dict] = None
 
 
-class ChatSession(BaseModel):
+class MessageIndex:
+    def __init__(self, messages: Sequence[Any]):
+        self.messages = messages
+        self.ids: List[int] = []
+        self.by_id: Dict[int, Any] = {}
+        self.positions: Dict[int, int] = {}
+        self.developer_positions: List[int] = []
+        for position, msg in enumerate(messages):
+            self.ids.append(msg.id)
+            self.by_id[msg.id] = msg
+            self.positions[msg.id] = position
+            if msg.role == MessageRole.DEVELOPER:
+                self.developer_positions.append(position)
+
+    def get(self, message_id: Optional[int]) -> Optional[Any]:
+        if message_id is None:
+            return None
+        return self.by_id.get(message_id)
+
+    def position_of(self, message_id: Optional[int]) -> Optional[int]:
+        if message_id is None:
+            return None
+        return self.positions.get(message_id)
+
+    def first_position_after(self, message_id: int) -> int:
+        return bisect_right(self.ids, message_id)
+
+    def developer_messages_after(self, position: int, limit: Optional[int] = None,
+                                 until: Optional[datetime] = None) -> List[Any]:
+        start = bisect_right(self.developer_positions, position)
+        stop = len(self.developer_positions) if limit is None else min(start + limit, len(self.developer_positions))
+        responses = []
+        for i in range(start, stop):
+            msg = self.messages[self.developer_positions[i]]
+            if until is not None and msg.timestamp > until:
+                break
+            responses.append(msg)
+        return responses
+
+
+class MessageLookup:
+    __slots__ = ()
+
+    def get_message(self, message_id: Optional[int]) -> Optional[Any]:
+        return self._index.get(message_id)
+
+    def position_of(self, message_id: Optional[int]) -> Optional[int]:
+        return self._index.position_of(message_id)
+
+    def first_position_after(self, message_id: int) -> int:
+        return self._index.first_position_after(message_id)
+
+    def developer_messages_after(self, position: int, limit: Optional[int] = None,
+                                 until: Optional[datetime] = None) -> List[Any]:
+        return self._index.developer_messages_after(position, limit, until)
+
+    @property
+    def last_message_id(self) -> Optional[int]:
+        return self.messages[-1].id if self.messages else None
+
+
+class ChatSession(BaseModel, MessageLookup):
     chat_id: str
     chat_title: Optional[str] = None
     source: str
@@ -29,3 +91,15 @@ class ChatSession(BaseModel):
     total_messages: int = 0
     imported_at: datetime = Field(default_factory=datetime.now)
 
+    _index: MessageIndex = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self.reindex()
+
+    def reindex(self):
+        self._index = MessageIndex(self.messages)
+
+    def link_replies(self):
+        for msg in self.messages:
+            if msg.reply_to_message_id:
+                msg.reply_to_message = self._index.get(msg.reply_to_message_id)
@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import List, Optional, Sequence
+from models.chat import ChatSession, ChatMessage, MessageRole, MessageIndex, MessageLookup
+
+
+class CompactMessage:
+    __slots__ = ("id", "text", "role", "timestamp", "reply_to_message_id")
+
+    def __init__(self, id: int, text: str, role: MessageRole, timestamp: datetime,
+                 reply_to_message_id: Optional[int] = None):
+        self.id = id
+        self.text = text
+        self.role = role
+        self.timestamp = timestamp
+        self.reply_to_message_id = reply_to_message_id
+
+    @classmethod
+    def from_model(cls, msg: ChatMessage) -> "CompactMessage":
+        return cls(msg.id, msg.text, msg.role, msg.timestamp, msg.reply_to_message_id)
+
+    def to_model(self) -> ChatMessage:
+        return ChatMessage(
+            id=self.id,
+            text=self.text,
+            role=self.role,
+            timestamp=self.timestamp,
+            reply_to_message_id=self.reply_to_message_id
+        )
+
+
+class CompactSession(MessageLookup):
+    __slots__ = ("chat_id", "chat_title", "source", "messages", "total_messages", "imported_at", "_index")
+
+    def __init__(self, chat_id: str, source: str, messages: Sequence[CompactMessage],
+                 chat_title: Optional[str] = None, imported_at: Optional[datetime] = None):
+        self.chat_id = chat_id
+        self.chat_title = chat_title
+        self.source = source
+        self.messages: List[CompactMessage] = list(messages)
+        self.total_messages = len(self.messages)
+        self.imported_at = imported_at or datetime.now()
+        self._index = MessageIndex(self.messages)
+
+    def __getstate__(self):
+        return (self.chat_id, self.chat_title, self.source, self.messages, self.imported_at)
+
+    def __setstate__(self, state):
+        chat_id, chat_title, source, messages, imported_at = state
+        self.__init__(chat_id, source, messages, chat_title, imported_at)
+
+    def get_reply_to(self, msg: CompactMessage) -> Optional[CompactMessage]:
+        return self._index.get(msg.reply_to_message_id)
+
+    @classmethod
+    def from_session(cls, session: ChatSession) -> "CompactSession":
+        return cls(
+            chat_id=session.chat_id,
+            chat_title=session.chat_title,
+            source=session.source,
+            messages=[CompactMessage.from_model(m) for m in session.messages],
+            imported_at=session.imported_at
+        )
+
+    def to_session(self) -> ChatSession:
+        session = ChatSession(
+            chat_id=self.chat_id,
+            chat_title=self.chat_title,
+            source=self.source,
+            messages=[m.to_model() for m in self.messages],
+            total_messages=self.total_messages,
+            imported_at=self.imported_at
+        )
+        session.link_replies()
+        return session
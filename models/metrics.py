@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class StageMetrics(BaseModel):
+    name: str
+    wall_time: float = 0.0
+    llm_calls: int = 0
+    cache_hits: int = 0
+    retries: int = 0
+    errors: int = 0
+    parse_failures: int = 0
+    reasks: int = 0
+    bisections: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+
+
+class RunMetrics(BaseModel):
+    stages: List[StageMetrics] = Field(default_factory=list)
+    wall_time: float = 0.0
+    llm_calls: int = 0
+    cache_hits: int = 0
+    retries: int = 0
+    errors: int = 0
+    parse_failures: int = 0
+    reasks: int = 0
+    bisections: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
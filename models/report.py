@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List, Optional, TYPE_CHECKING
+from models.metrics import RunMetrics
 
 if TYPE_CHECKING:
     from models.task import Task
@@ -22,5 +23,24 @@ class AnalysisReport(BaseModel):
     analyzed_at: datetime = Field(default_factory=datetime.now)
     summary: ReportSummary
     tasks: List[Task] = Field(default_factory=list)
-    missed_tasks: List[Task] = Field(default_factory=list)
+    missed_task_ids: List[str] = Field(default_factory=list)
+    metrics: Optional[RunMetrics] = None
 
+    @property
+    def missed_tasks(self) -> List[Task]:
+        missed_ids = set(self.missed_task_ids)
+        return [t for t in self.tasks if t.id in missed_ids]
+
+
+class BatchChatResult(BaseModel):
+    identifier: str
+    chat_id: Optional[str] = None
+    chat_title: Optional[str] = None
+    summary: Optional[ReportSummary] = None
+    error: Optional[str] = None
+
+
+class BatchSummary(BaseModel):
+    generated_at: datetime = Field(default_factory=datetime.now)
+    total: ReportSummary
+    chats: List[BatchChatResult] = Field(default_factory=list)
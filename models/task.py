@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Any, List, Optional
 from enum import Enum
 
 
@@ -24,6 +24,7 @@ class Task(BaseModel):
     description: str
     source_message_id: int
     source_message_text: str
+    source_message_ids: List[int] = Field(default_factory=list)
     status: TaskStatus = TaskStatus.PENDING
     priority: TaskPriority = TaskPriority.MEDIUM
     
@@ -38,3 +39,6 @@ class Task(BaseModel):
     missed_reason: Optional[str] = None
     completion_evidence: Optional[str] = None
 
+    def model_post_init(self, __context: Any) -> None:
+        if not self.source_message_ids:
+            self.source_message_ids = [self.source_message_id]
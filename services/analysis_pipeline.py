@@ -0,0 +1,88 @@
+import asyncio
+import contextlib
+from typing import List, Optional
+from models.chat import ChatSession
+from models.task import Task
+from services.task_extractor import TaskExtractor
+from services.task_matcher import TaskMatcher
+from services.task_dedup import TaskDeduplicator
+from services.openai_batch import BatchOpenAIClient
+from services.metrics import MetricsCollector
+from config.settings import settings
+
+
+class AnalysisPipeline:
+    def __init__(self, extractor: TaskExtractor, matcher: TaskMatcher,
+                 deduplicator: Optional[TaskDeduplicator] = None, queue_size: Optional[int] = None,
+                 workers: Optional[int] = None):
+        self.extractor = extractor
+        self.matcher = matcher
+        self.deduplicator = deduplicator
+        self.queue_size = queue_size or settings.pipeline_queue_size
+        self.workers = workers or settings.pipeline_match_workers
+
+    async def run(self, session: ChatSession, after_message_id: Optional[int] = None,
+                  metrics: Optional[MetricsCollector] = None) -> List[Task]:
+        if isinstance(self.extractor.ai_client, BatchOpenAIClient):
+            return await self._run_sequential(session, after_message_id, metrics)
+        
+        queue: "asyncio.Queue[Optional[List[Task]]]" = asyncio.Queue(maxsize=self.queue_size)
+        released = asyncio.Condition()
+        next_chunk = 1
+        unique: List[Task] = []
+        queued = set()
+        stage = self._stage(metrics)
+        
+        async def release_in_order(index: int, tasks: List[Task]):
+            nonlocal next_chunk
+            async with released:
+                await released.wait_for(lambda: next_chunk == index)
+                recheck = []
+                if self.deduplicator:
+                    tasks = self.deduplicator.add(tasks)
+                    recheck = [task for task in self.deduplicator.pop_updated() if task.id in queued]
+                unique.extend(tasks)
+                queued.update(task.id for task in tasks)
+                if recheck or tasks:
+                    await queue.put(recheck + tasks)
+                next_chunk += 1
+                released.notify_all()
+        
+        async def extract():
+            with stage("extraction"):
+                try:
+                    tasks = await self.extractor.extract_tasks(session, after_message_id, on_tasks=release_in_order)
+                finally:
+                    for _ in range(self.workers):
+                        await queue.put(None)
+            merged = len(tasks) - len(unique)
+            duplicates = f", из них повторов объединено: {merged}" if merged else ""
+            print(f"Найдено задач: {len(tasks)}{duplicates}, сопоставление продолжается...")
+        
+        async def match():
+            with stage("matching"):
+                await asyncio.gather(*(self.matcher.consume(session, queue) for _ in range(self.workers)))
+        
+        await asyncio.gather(extract(), match())
+        return unique
+
+    async def _run_sequential(self, session: ChatSession, after_message_id: Optional[int] = None,
+                              metrics: Optional[MetricsCollector] = None) -> List[Task]:
+        stage = self._stage(metrics)
+        with stage("extraction"):
+            tasks = await self.extractor.extract_tasks(session, after_message_id)
+            unique = self.deduplicator.add(tasks) if self.deduplicator else tasks
+        merged = len(tasks) - len(unique)
+        duplicates = f", из них повторов объединено: {merged}" if merged else ""
+        print(f"Найдено задач: {len(tasks)}{duplicates}")
+        
+        if unique:
+            with stage("matching"):
+                await self.matcher.match_tasks_with_responses(session, unique)
+        return unique
+
+    @staticmethod
+    def _stage(metrics: Optional[MetricsCollector]):
+        def stage(name: str):
+            return metrics.stage(name) if metrics else contextlib.nullcontext()
+        return stage
@@ -0,0 +1,32 @@
+import re
+from pathlib import Path
+from typing import Optional
+from models.analysis_state import ChatAnalysisState
+from config.settings import settings
+
+
+class AnalysisStateStore:
+    def __init__(self, state_path: Optional[Path] = None):
+        self.state_path = state_path or settings.state_path
+        self.state_path.mkdir(parents=True, exist_ok=True)
+
+    def _path_for(self, chat_id: str) -> Path:
+        safe_id = re.sub(r"[^\w\-]", "_", chat_id)
+        return self.state_path / f"state_{safe_id}.json"
+
+    def load(self, chat_id: str) -> Optional[ChatAnalysisState]:
+        filepath = self._path_for(chat_id)
+        if not filepath.exists():
+            return None
+        try:
+            return ChatAnalysisState.model_validate_json(filepath.read_text(encoding='utf-8'))
+        except Exception as e:
+            print(f"Не удалось прочитать состояние анализа {filepath}: {e}")
+            return None
+
+    def save(self, state: ChatAnalysisState) -> Path:
+        filepath = self._path_for(state.chat_id)
+        tmp_path = filepath.with_suffix(".tmp")
+        tmp_path.write_text(state.model_dump_json(indent=2), encoding='utf-8')
+        tmp_path.replace(filepath)
+        return filepath
@@ -1,95 +1,163 @@
+import codecs
 import json
+import mmap
+import re
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
 from models.chat import ChatSession, ChatMessage, MessageRole
+from models.compact import CompactMessage, CompactSession
+from services.json_stream import iter_json_array
+from config.settings import settings
+
+
+_TXT_HEADER = re.compile(
+    r"(?:\[?(?:(?P<date>\d{4}-\d{2}-\d{2}|\d{1,2}\.\d{1,2}\.\d{4}),?[ T])?"
+    r"(?P<clock>\d{1,2}:\d{2}(?::\d{2})?)\]?(?:\s*-)?\s*)?"
+    r"(?:(?P<speaker>Клиент|Client|Разработчик|Developer):)?"
+)
+
+_TXT_ROLES = {
+    "Клиент": MessageRole.CLIENT,
+    "Client": MessageRole.CLIENT,
+    "Разработчик": MessageRole.DEVELOPER,
+    "Developer": MessageRole.DEVELOPER,
+}
+
+
+@lru_cache(maxsize=1024)
+def _parse_txt_date(date: str) -> Tuple[int, int, int]:
+    if "-" in date:
+        year, month, day = date.split("-")
+    else:
+        day, month, year = date.split(".")
+    return int(year), int(month), int(day)
+
+
+def _parse_txt_timestamp(date: Optional[str], clock: Optional[str], previous: Optional[datetime],
+                         fallback: datetime) -> Optional[datetime]:
+    if date:
+        year, month, day = _parse_txt_date(date)
+    elif clock:
+        base = previous or fallback
+        year, month, day = base.year, base.month, base.day
+    else:
+        return previous
+    
+    hour, minute, *second = clock.split(":")
+    try:
+        timestamp = datetime(year, month, day, int(hour), int(minute), int(second[0]) if second else 0)
+    except ValueError:
+        return previous
+    if previous and not date and timestamp < previous:
+        timestamp += timedelta(days=1)
+    return timestamp
 
 
 class ChatParser:
+    SUPPORTED_SUFFIXES = (".json", ".txt")
+
     @staticmethod
-    def parse_telegram_export(file_path: Path) -> ChatSession:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        messages_list = []
-        chat_name = data.get("name", "Unknown")
-        
-        for msg_data in data.get("messages", []):
-            if msg_data.get("type") != "message" or not msg_data.get("text"):
-                continue
-            
-            text = msg_data.get("text")
-            if isinstance(text, list):
-                text = " ".join([item.get("text", "") for item in text if isinstance(item, dict)])
-            
-            role = MessageRole.CLIENT
-            if msg_data.get("from") and isinstance(msg_data.get("from"), str):
-                if "bot" in msg_data.get("from", "").lower() or "developer" in msg_data.get("from", "").lower():
-                    role = MessageRole.DEVELOPER
-            
-            date_str = msg_data.get("date", "")
-            try:
-                timestamp = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-            except:
-                timestamp = datetime.now()
-            
-            reply_to_id = msg_data.get("reply_to_message_id")
-            
-            chat_msg = ChatMessage(
-                id=msg_data.get("id", len(messages_list) + 1),
-                text=text,
-                role=role,
-                timestamp=timestamp,
-                reply_to_message_id=reply_to_id,
-                raw_data=msg_data
+    def parse_file(file_path: Path) -> Union[ChatSession, CompactSession]:
+        if file_path.suffix == ".json":
+            return ChatParser.parse_telegram_export(file_path, compact=True)
+        if file_path.suffix == ".txt":
+            return ChatParser.parse_txt(file_path, compact=True)
+        raise ValueError(f"Неподдерживаемый формат: {file_path.suffix}")
+
+    @staticmethod
+    def parse_telegram_export(file_path: Path, streaming: bool = False, keep_raw_data: bool = True,
+                              compact: bool = False) -> Union[ChatSession, CompactSession]:
+        if compact:
+            header = {}
+            messages_list = list(ChatParser.iter_telegram_export(file_path, header=header, compact=True))
+            return CompactSession(
+                chat_id=str(file_path.stem),
+                chat_title=header.get("name", "Unknown"),
+                source="telegram_export",
+                messages=messages_list
             )
-            messages_list.append(chat_msg)
         
-        for msg in messages_list:
-            if msg.reply_to_message_id:
-                for other_msg in messages_list:
-                    if other_msg.id == msg.reply_to_message_id:
-                        msg.reply_to_message = other_msg
-                        break
+        if streaming:
+            header = {}
+            messages_list = list(ChatParser.iter_telegram_export(file_path, keep_raw_data, header))
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            messages_list = []
+            for msg_data in header.get("messages", []):
+                chat_msg = ChatParser._build_telegram_message(msg_data, len(messages_list) + 1, keep_raw_data)
+                if chat_msg:
+                    messages_list.append(chat_msg)
         
-        return ChatSession(
+        session = ChatSession(
             chat_id=str(file_path.stem),
-            chat_title=chat_name,
+            chat_title=header.get("name", "Unknown"),
             source="telegram_export",
             messages=messages_list,
             total_messages=len(messages_list)
         )
+        session.link_replies()
+        
+        return session
 
     @staticmethod
-    def parse_txt(file_path: Path) -> ChatSession:
+    def iter_telegram_export(file_path: Path, keep_raw_data: bool = False, header: Optional[Dict[str, Any]] = None,
+                             compact: bool = False) -> Iterator[Union[ChatMessage, CompactMessage]]:
+        count = 0
         with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+            for msg_data in iter_json_array(f, "messages", header):
+                chat_msg = ChatParser._build_telegram_message(msg_data, count + 1, keep_raw_data, compact)
+                if chat_msg:
+                    count += 1
+                    yield chat_msg
+
+    @staticmethod
+    def _build_telegram_message(msg_data: dict, fallback_id: int, keep_raw_data: bool,
+                                compact: bool = False) -> Optional[Union[ChatMessage, CompactMessage]]:
+        if msg_data.get("type") != "message" or not msg_data.get("text"):
+            return None
         
-        messages_list = []
-        current_role = MessageRole.UNKNOWN
+        text = msg_data.get("text")
+        if isinstance(text, list):
+            text = " ".join([item.get("text", "") for item in text if isinstance(item, dict)])
         
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-            
-            if line.startswith("Клиент:") or line.startswith("Client:"):
-                current_role = MessageRole.CLIENT
-                text = line.split(":", 1)[1].strip()
-            elif line.startswith("Разработчик:") or line.startswith("Developer:"):
-                current_role = MessageRole.DEVELOPER
-                text = line.split(":", 1)[1].strip()
-            else:
-                text = line
-            
-            if text:
-                chat_msg = ChatMessage(
-                    id=i,
-                    text=text,
-                    role=current_role,
-                    timestamp=datetime.now(),
-                    raw_data={"line_number": i}
-                )
-                messages_list.append(chat_msg)
+        role = MessageRole.CLIENT
+        if msg_data.get("from") and isinstance(msg_data.get("from"), str):
+            if "bot" in msg_data.get("from", "").lower() or "developer" in msg_data.get("from", "").lower():
+                role = MessageRole.DEVELOPER
+        
+        date_str = msg_data.get("date", "")
+        try:
+            timestamp = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+        except:
+            timestamp = datetime.now()
+        
+        if compact:
+            return CompactMessage(msg_data.get("id", fallback_id), text, role, timestamp, msg_data.get("reply_to_message_id"))
+        
+        return ChatMessage(
+            id=msg_data.get("id", fallback_id),
+            text=text,
+            role=role,
+            timestamp=timestamp,
+            reply_to_message_id=msg_data.get("reply_to_message_id"),
+            raw_data=msg_data if keep_raw_data else None
+        )
+
+    @staticmethod
+    def parse_txt(file_path: Path, compact: bool = False,
+                  use_mmap: Optional[bool] = None) -> Union[ChatSession, CompactSession]:
+        messages_list = list(ChatParser.iter_txt(file_path, compact, use_mmap))
+        
+        if compact:
+            return CompactSession(
+                chat_id=str(file_path.stem),
+                chat_title=file_path.stem,
+                source="txt",
+                messages=messages_list
+            )
         
         return ChatSession(
             chat_id=str(file_path.stem),
@@ -99,3 +167,76 @@ class ChatParser:
             total_messages=len(messages_list)
         )
 
+    @staticmethod
+    def iter_txt(file_path: Path, compact: bool = False,
+                 use_mmap: Optional[bool] = None) -> Iterator[Union[ChatMessage, CompactMessage]]:
+        fallback = datetime.fromtimestamp(file_path.stat().st_mtime)
+        timestamp: Optional[datetime] = None
+        role = MessageRole.UNKNOWN
+        line_number = 0
+        parts = []
+        
+        def build() -> Union[ChatMessage, CompactMessage]:
+            text = "\n".join(parts)
+            if compact:
+                return CompactMessage(line_number, text, role, timestamp or fallback)
+            return ChatMessage(
+                id=line_number,
+                text=text,
+                role=role,
+                timestamp=timestamp or fallback,
+                raw_data={"line_number": line_number}
+            )
+        
+        lookahead = settings.txt_timestamp_lookahead_lines
+        undated = []
+        for i, line in enumerate(ChatParser._iter_lines(file_path, use_mmap), 1):
+            line = line.strip()
+            if not line:
+                continue
+            
+            header = _TXT_HEADER.match(line)
+            date, clock, speaker = header.groups()
+            if not speaker:
+                line_number = line_number or i
+                parts.append(line)
+                continue
+            
+            if parts:
+                message = build()
+                if timestamp is None and lookahead:
+                    undated.append(message)
+                else:
+                    yield message
+            if lookahead and i > lookahead:
+                yield from undated
+                undated, lookahead = [], 0
+            line_number, parts = i, []
+            role = _TXT_ROLES[speaker]
+            timestamp = _parse_txt_timestamp(date, clock, timestamp, fallback)
+            if timestamp is not None and undated:
+                for message in undated:
+                    message.timestamp = timestamp
+                yield from undated
+                undated = []
+            text = line[header.end():].strip()
+            if text:
+                parts.append(text)
+        
+        yield from undated
+        if parts:
+            yield build()
+
+    @staticmethod
+    def _iter_lines(file_path: Path, use_mmap: Optional[bool] = None) -> Iterator[str]:
+        use_mmap = settings.txt_parser_mmap if use_mmap is None else use_mmap
+        if not use_mmap or not file_path.stat().st_size:
+            with open(file_path, 'r', encoding='utf-8-sig') as f:
+                yield from f
+            return
+        
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+                mapped.seek(len(codecs.BOM_UTF8))
+            for line in iter(mapped.readline, b""):
+                yield line.decode('utf-8')
@@ -0,0 +1,152 @@
+import json
+import re
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+class JsonStreamReader:
+    def __init__(self, fp: TextIO, chunk_size: int = 1 << 20):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.fp.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Ожидался символ '{char}', найден '{found or 'EOF'}' (позиция {self.pos})")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if self.eof or (end < len(self.buffer) and not self._number_may_continue(obj, end)):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                obj, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return obj
+
+    def _number_may_continue(self, obj: Any, end: int) -> bool:
+        return isinstance(obj, (int, float)) and not isinstance(obj, bool) and len(self.buffer) - end <= 2
+
+
+def iter_json_array(fp: TextIO, key: str, header: Optional[Dict[str, Any]] = None,
+                    chunk_size: int = 1 << 20) -> Iterator[Any]:
+    reader = JsonStreamReader(fp, chunk_size)
+    if header is None:
+        header = {}
+    
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    
+    while True:
+        member = reader.value()
+        reader.expect(":")
+        
+        if member == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    separator = reader.peek()
+                    reader.pos += 1
+                    if separator == "]":
+                        break
+                    if separator != ",":
+                        raise ValueError(f"Некорректный JSON массив '{key}' (позиция {reader.pos})")
+        else:
+            header[member] = reader.value()
+        
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError(f"Некорректный JSON объект (позиция {reader.pos})")
+
+
+_DECODER = json.JSONDecoder()
+_CODE_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+class JsonResponseError(ValueError):
+    def __init__(self, message: str, truncated: bool = False):
+        super().__init__(message)
+        self.truncated = truncated
+
+
+def _is_unclosed(text: str, start: int) -> bool:
+    depth = 0
+    in_string = False
+    escape = False
+    for char in text[start:]:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return False
+    return True
+
+
+def parse_json_response(text: str) -> Any:
+    cleaned = _CODE_FENCE.sub("", (text or "").strip())
+    starts = [i for i in (cleaned.find("{"), cleaned.find("[")) if i >= 0]
+    if not starts:
+        raise JsonResponseError("В ответе нет JSON")
+    start = min(starts)
+    
+    try:
+        return _DECODER.raw_decode(cleaned, start)[0]
+    except json.JSONDecodeError as e:
+        error = e
+    
+    if _is_unclosed(cleaned, start):
+        raise JsonResponseError(f"Ответ обрезан: {error.msg} (позиция {error.pos})", truncated=True)
+    
+    try:
+        return _DECODER.raw_decode(_TRAILING_COMMA.sub(r"\1", cleaned), start)[0]
+    except json.JSONDecodeError:
+        raise JsonResponseError(f"Некорректный JSON в ответе: {error.msg} (позиция {error.pos})")
@@ -0,0 +1,74 @@
+import re
+from typing import Any, Dict, List, Optional
+from config.settings import settings
+from services.token_estimator import estimate_message_tokens
+
+
+_WORD = re.compile(r"[\w']+", re.UNICODE)
+
+_TASK_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"\b(сдела|добав|исправ|измен|поправ|убер|удал|настро|подключ|загруз|выгруз|обнов|перенес|провер|посмотр|"
+    r"пришл|отправ|скин|выстав|верн|оплат|созда|замен|разбер|подготов|доработ|сверст|реализ)\w*",
+    r"\b(нуж|надо|необходимо|требуется|хочу|хотим|хотелось|прошу|просим|пожалуйста|можете|можно|сможете|"
+    r"когда|почему|зачем|сколько|срок|дедлайн)\w*",
+    r"\b(не работает|не открывается|не грузится|не приходит|не пришл|сломал|ошибк|баг|глюч|висит|падает)\w*",
+    r"\b(сч[её]т|акт|договор|оплат|доступ|парол|логин|сайт|страниц|кнопк|форм|бот|макет|дизайн|тз)\w*",
+    r"\b(please|pls|can you|could you|would you|need|needs|want|fix|add|change|update|remove|delete|send|"
+    r"create|check|deploy|make|why|when|how|deadline|asap|bug|error|issue|broken|doesn't work|not working|"
+    r"invoice|access|password)\b",
+    r"\?",
+)]
+
+_NOISE = {
+    "ок", "окей", "ok", "okay", "k", "kk", "угу", "ага", "да", "нет", "yes", "no", "yep", "nope",
+    "спасибо", "спс", "благодарю", "thanks", "thank you", "thx", "ty",
+    "привет", "здравствуйте", "добрый день", "доброе утро", "добрый вечер", "hi", "hello", "hey",
+    "понял", "поняла", "понятно", "ясно", "хорошо", "отлично", "супер", "класс", "круто", "good", "great",
+    "got it", "cool", "nice", "до свидания", "пока", "bye", "и вам", "взаимно",
+}
+
+
+class MessagePreFilter:
+    def __init__(self, threshold: Optional[float] = None, recall_margin: Optional[float] = None):
+        self.threshold = settings.prefilter_threshold if threshold is None else threshold
+        self.recall_margin = settings.prefilter_recall_margin if recall_margin is None else recall_margin
+        self.removed_messages = 0
+        self.removed_tokens = 0
+
+    def score(self, text: str) -> float:
+        words = _WORD.findall(text.lower())
+        if not words:
+            return 0.0
+        
+        normalized = " ".join(words)
+        content = [word for word in words if word not in _NOISE]
+        if normalized in _NOISE or not content:
+            return 0.05
+        
+        score = 0.3 * len(content) / len(words)
+        if len(words) > 5:
+            score += 0.1
+        
+        for pattern in _TASK_PATTERNS:
+            if pattern.search(text):
+                score += 0.3
+        
+        if re.search(r"\d|https?://", text):
+            score += 0.1
+        
+        return min(score, 1.0)
+
+    def filter(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        cutoff = self.threshold - self.recall_margin
+        kept = []
+        self.removed_messages = 0
+        self.removed_tokens = 0
+        
+        for message in messages:
+            if self.score(message.get("text", "")) >= cutoff:
+                kept.append(message)
+            else:
+                self.removed_messages += 1
+                self.removed_tokens += estimate_message_tokens(message)
+        
+        return kept
@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+from models.chat import MessageRole
+from models.compact import CompactMessage, CompactSession
+from config.settings import settings
+
+
+StoredMessage = Tuple[int, str, str, str, Optional[int], Optional[int]]
+
+
+class MessageStore:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or settings.message_store_path
+        self._lock = threading.Lock()
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                chat_id TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                role TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                reply_to_message_id INTEGER,
+                sender_id INTEGER,
+                PRIMARY KEY (chat_id, message_id)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                chat_id TEXT PRIMARY KEY,
+                chat_title TEXT,
+                max_message_id INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def max_message_id(self, chat_id: str) -> int:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT max_message_id FROM sync_state WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def save_batch(self, chat_id: str, chat_title: Optional[str], messages: Iterable[StoredMessage], max_message_id: int):
+        with self._lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO messages "
+                    "(chat_id, message_id, text, role, timestamp, reply_to_message_id, sender_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(chat_id, *message) for message in messages]
+                )
+                self.conn.execute(
+                    "INSERT INTO sync_state (chat_id, chat_title, max_message_id, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(chat_id) DO UPDATE SET chat_title = excluded.chat_title, "
+                    "max_message_id = MAX(max_message_id, excluded.max_message_id), updated_at = excluded.updated_at",
+                    (chat_id, chat_title, max_message_id, time.time())
+                )
+
+    def load_session(self, chat_id: str, chat_title: Optional[str] = None, min_id: Optional[int] = None,
+                     limit: Optional[int] = None) -> CompactSession:
+        query = ("SELECT message_id, text, role, timestamp, reply_to_message_id FROM messages "
+                 "WHERE chat_id = ? AND message_id > ? ORDER BY message_id DESC")
+        params = [chat_id, min_id or 0]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        
+        messages = [
+            CompactMessage(message_id, text, MessageRole(role), datetime.fromisoformat(timestamp), reply_to)
+            for message_id, text, role, timestamp, reply_to in reversed(rows)
+        ]
+        return CompactSession(
+            chat_id=chat_id,
+            chat_title=chat_title,
+            source="telegram_api",
+            messages=messages
+        )
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,157 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from models.metrics import RunMetrics, StageMetrics
+from config.settings import settings
+
+
+_current_collector: ContextVar[Optional["MetricsCollector"]] = ContextVar("metrics_collector", default=None)
+_current_stage: ContextVar[str] = ContextVar("metrics_stage", default="other")
+
+
+class MetricsCollector:
+    def __init__(self):
+        self.stages: Dict[str, StageMetrics] = {}
+        self.wall_time = 0.0
+        self._active_stages = 0
+        self._busy_since = 0.0
+        self._open_stages: Dict[int, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, name: str) -> StageMetrics:
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name=name)
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageMetrics]:
+        collector_token = _current_collector.set(self)
+        stage_token = _current_stage.set(name)
+        with self._lock:
+            stage = self._stage(name)
+            started = time.perf_counter()
+            if not self._active_stages:
+                self._busy_since = started
+            self._active_stages += 1
+            key = id(stage_token)
+            self._open_stages[key] = (name, started)
+        try:
+            yield stage
+        finally:
+            with self._lock:
+                finished = time.perf_counter()
+                stage.wall_time += finished - started
+                del self._open_stages[key]
+                self._active_stages -= 1
+                if not self._active_stages:
+                    self.wall_time += finished - self._busy_since
+            _current_stage.reset(stage_token)
+            _current_collector.reset(collector_token)
+
+    def add_stage_time(self, name: str, seconds: float):
+        with self._lock:
+            self._stage(name).wall_time += seconds
+            self.wall_time += seconds
+
+    def record(self, llm_calls: int = 0, cache_hits: int = 0, retries: int = 0, errors: int = 0,
+               parse_failures: int = 0, reasks: int = 0, bisections: int = 0,
+               prompt_tokens: int = 0, completion_tokens: int = 0, price_factor: float = 1.0):
+        with self._lock:
+            stage = self._stage(_current_stage.get())
+            stage.llm_calls += llm_calls
+            stage.cache_hits += cache_hits
+            stage.retries += retries
+            stage.errors += errors
+            stage.parse_failures += parse_failures
+            stage.reasks += reasks
+            stage.bisections += bisections
+            stage.prompt_tokens += prompt_tokens
+            stage.completion_tokens += completion_tokens
+            stage.cost_usd += estimate_cost(prompt_tokens, completion_tokens) * price_factor
+
+    def to_model(self) -> RunMetrics:
+        with self._lock:
+            now = time.perf_counter()
+            stages = {name: stage.model_copy() for name, stage in self.stages.items()}
+            for name, started in self._open_stages.values():
+                stages[name].wall_time += now - started
+            stages = list(stages.values())
+            wall_time = self.wall_time
+            if self._active_stages:
+                wall_time += now - self._busy_since
+        metrics = RunMetrics(stages=stages, wall_time=wall_time)
+        for stage in stages:
+            metrics.llm_calls += stage.llm_calls
+            metrics.cache_hits += stage.cache_hits
+            metrics.retries += stage.retries
+            metrics.errors += stage.errors
+            metrics.parse_failures += stage.parse_failures
+            metrics.reasks += stage.reasks
+            metrics.bisections += stage.bisections
+            metrics.prompt_tokens += stage.prompt_tokens
+            metrics.completion_tokens += stage.completion_tokens
+            metrics.cost_usd += stage.cost_usd
+        return metrics
+
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return (prompt_tokens * settings.openai_input_price_per_1m
+            + completion_tokens * settings.openai_output_price_per_1m) / 1_000_000
+
+
+def record(**kwargs):
+    collector = _current_collector.get()
+    if collector:
+        collector.record(**kwargs)
+
+
+_published: Dict[str, RunMetrics] = {}
+_publish_lock = threading.Lock()
+
+_PROMETHEUS_METRICS = [
+    ("stage_seconds", "wall_time", "Время выполнения этапа, с"),
+    ("llm_calls", "llm_calls", "Запросы к LLM"),
+    ("llm_cache_hits", "cache_hits", "Ответы LLM из кэша"),
+    ("llm_retries", "retries", "Повторы запросов к LLM"),
+    ("llm_errors", "errors", "Ошибки запросов к LLM"),
+    ("llm_parse_failures", "parse_failures", "Ответы LLM с некорректным JSON"),
+    ("llm_reasks", "reasks", "Повторные запросы после некорректного ответа"),
+    ("llm_bisections", "bisections", "Деления частей чата из-за слишком большого ответа"),
+    ("llm_prompt_tokens", "prompt_tokens", "Входные токены"),
+    ("llm_completion_tokens", "completion_tokens", "Выходные токены"),
+    ("llm_cost_usd", "cost_usd", "Оценка стоимости, USD"),
+]
+
+
+def _label(value: str) -> str:
+    return re.sub(r'(["\\\\])', r"\\\1", value).replace("\n", " ")
+
+
+def publish(chat_id: str, metrics: RunMetrics) -> Optional[Path]:
+    path = settings.metrics_textfile_path
+    if not path:
+        return None
+    
+    with _publish_lock:
+        _published[chat_id] = metrics
+        lines = []
+        for name, field, help_text in _PROMETHEUS_METRICS:
+            metric = f"analyze_chats_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for published_chat_id, run in _published.items():
+                for stage in run.stages:
+                    lines.append(
+                        f'{metric}{{chat_id="{_label(published_chat_id)}",stage="{_label(stage.name)}"}} '
+                        f"{getattr(stage, field)}"
+                    )
+        
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        tmp_path.replace(path)
+    return path
@@ -0,0 +1,249 @@
+import asyncio
+import contextvars
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set
+from openai.types.chat import ChatCompletion
+from models.batch_job import BatchJob, BatchJobState
+from services.openai_client import OpenAIClient
+from services.rate_limiter import RateController
+from services.llm_cache import LLMCache
+from config.settings import settings
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchJobStore:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or settings.state_path / "batch_jobs.json"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def load(self) -> List[BatchJob]:
+        if not self.path.exists():
+            return []
+        try:
+            return BatchJobState.model_validate_json(self.path.read_text(encoding='utf-8')).jobs
+        except Exception as e:
+            print(f"Не удалось прочитать состояние пакетных заданий {self.path}: {e}")
+            return []
+
+    def save(self, jobs: List[BatchJob]):
+        state = BatchJobState(jobs=jobs, updated_at=datetime.now())
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(state.model_dump_json(indent=2), encoding='utf-8')
+        tmp_path.replace(self.path)
+
+    def add(self, job: BatchJob):
+        self.save([j for j in self.load() if j.batch_id != job.batch_id] + [job])
+
+    def update(self, job: BatchJob):
+        self.save([job if j.batch_id == job.batch_id else j for j in self.load()])
+
+    def remove(self, batch_id: str):
+        self.save([j for j in self.load() if j.batch_id != batch_id])
+
+
+class BatchRequest:
+    __slots__ = ("prompt", "system_prompt", "response_format", "body", "futures", "context")
+
+    def __init__(self, prompt: str, system_prompt: Optional[str], response_format: Optional[Dict[str, Any]],
+                 body: Dict[str, Any]):
+        self.prompt = prompt
+        self.system_prompt = system_prompt
+        self.response_format = response_format
+        self.body = body
+        self.futures: List[asyncio.Future] = []
+        self.context = contextvars.copy_context()
+
+
+class BatchOpenAIClient(OpenAIClient):
+    def __init__(self, rate_controller: Optional[RateController] = None, job_store: Optional[BatchJobStore] = None,
+                 poll_interval: Optional[float] = None, collect_delay: Optional[float] = None):
+        super().__init__(rate_controller)
+        self.job_store = job_store or BatchJobStore()
+        self.poll_interval = poll_interval if poll_interval is not None else settings.openai_batch_poll_seconds
+        self.collect_delay = collect_delay if collect_delay is not None else settings.openai_batch_collect_seconds
+        self.max_requests = settings.openai_batch_max_requests
+        self._pending: Dict[str, BatchRequest] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._last_enqueued = 0.0
+
+    async def generate(self, prompt: str, system_prompt: Optional[str] = None,
+                       response_format: Optional[Dict[str, Any]] = None, use_cache: bool = True) -> str:
+        cache_key, cached = self._cache_lookup(prompt, system_prompt, response_format, use_cache)
+        if cached is not None:
+            return cached
+        
+        key = cache_key or LLMCache.make_key(self.model, system_prompt, prompt, self.temperature, response_format)
+        request = self._pending.get(key)
+        if request is None:
+            body = {
+                "model": self.model,
+                "messages": self._build_messages(prompt, system_prompt),
+                "temperature": self.temperature
+            }
+            if response_format:
+                body["response_format"] = response_format
+            request = self._pending[key] = BatchRequest(prompt, system_prompt, response_format, body)
+        
+        future = asyncio.get_running_loop().create_future()
+        request.futures.append(future)
+        self._last_enqueued = time.monotonic()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_when_idle())
+            self._flush_tasks.add(self._flush_task)
+            self._flush_task.add_done_callback(self._flush_tasks.discard)
+        
+        return await future
+
+    async def aclose(self):
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks)
+        await super().aclose()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            for task in self._flush_tasks:
+                task.cancel()
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await super().__aexit__(exc_type, exc, tb)
+
+    async def _flush_when_idle(self):
+        while True:
+            await asyncio.sleep(self.collect_delay)
+            if time.monotonic() - self._last_enqueued >= self.collect_delay:
+                break
+        
+        requests, self._pending, self._flush_task = self._pending, {}, None
+        
+        try:
+            results = await self._run_batches(requests)
+        except Exception as e:
+            print(f"Ошибка пакетного режима OpenAI: {e}, запросы будут выполнены обычным способом")
+            results = {}
+        
+        fallback = []
+        for key, request in requests.items():
+            content = results.get(key)
+            if content is None:
+                fallback.append(request.context.run(asyncio.ensure_future, self._generate_online(request)))
+            else:
+                self._resolve(request, content)
+        
+        if fallback:
+            await asyncio.gather(*fallback)
+
+    async def _generate_online(self, request: BatchRequest):
+        try:
+            content = await OpenAIClient.generate(self, request.prompt, request.system_prompt,
+                                                  request.response_format, use_cache=False)
+        except Exception as e:
+            for future in request.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._resolve(request, content)
+
+    @staticmethod
+    def _resolve(request: BatchRequest, content: str):
+        for future in request.futures:
+            if not future.done():
+                future.set_result(content)
+
+    async def _run_batches(self, requests: Dict[str, BatchRequest]) -> Dict[str, str]:
+        needed: Set[str] = set(requests)
+        results: Dict[str, str] = {}
+        
+        for job in self.job_store.load():
+            if needed & set(job.custom_ids):
+                print(f"Возобновление пакетного задания {job.batch_id} ({len(job.custom_ids)} запросов)...")
+                results.update(await self._wait_for_job(job, requests))
+                needed -= set(job.custom_ids)
+        
+        keys = [key for key in requests if key in needed]
+        jobs = []
+        for start in range(0, len(keys), self.max_requests):
+            jobs.append(await self._submit(keys[start:start + self.max_requests], requests))
+        
+        for job_results in await asyncio.gather(*(self._wait_for_job(job, requests) for job in jobs)):
+            results.update(job_results)
+        
+        return results
+
+    async def _submit(self, keys: List[str], requests: Dict[str, BatchRequest]) -> BatchJob:
+        lines = [
+            json.dumps({"custom_id": key, "method": "POST", "url": BATCH_ENDPOINT, "body": requests[key].body},
+                       ensure_ascii=False)
+            for key in keys
+        ]
+        input_file = await self.client.files.create(
+            file=("batch_input.jsonl", ("\n".join(lines) + "\n").encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=settings.openai_batch_completion_window
+        )
+        
+        job = BatchJob(batch_id=batch.id, input_file_id=input_file.id, custom_ids=keys, status=batch.status)
+        self.job_store.add(job)
+        print(f"Отправлено пакетное задание {batch.id}: запросов {len(keys)}")
+        return job
+
+    async def _wait_for_job(self, job: BatchJob, requests: Dict[str, BatchRequest]) -> Dict[str, str]:
+        while True:
+            batch = await self.client.batches.retrieve(job.batch_id)
+            if batch.status != job.status:
+                job.status = batch.status
+                self.job_store.update(job)
+                counts = batch.request_counts
+                progress = f", выполнено {counts.completed}/{counts.total}" if counts else ""
+                print(f"  Пакетное задание {job.batch_id}: {batch.status}{progress}")
+            if batch.status in TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(self.poll_interval)
+        
+        results = {}
+        if batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            results = self._parse_output(output.text, set(job.custom_ids), requests)
+        
+        missing = len(job.custom_ids) - len(results)
+        if missing:
+            print(f"  Пакетное задание {job.batch_id}: без ответа {missing} запросов, они будут выполнены обычным способом")
+        
+        self.job_store.remove(job.batch_id)
+        return results
+
+    def _parse_output(self, text: str, custom_ids: Set[str], requests: Dict[str, BatchRequest]) -> Dict[str, str]:
+        results = {}
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                key = item.get("custom_id")
+                response = item.get("response") or {}
+                if key not in custom_ids or response.get("status_code") != 200:
+                    continue
+                completion = ChatCompletion.model_validate(response["body"])
+            except Exception as e:
+                print(f"  Не удалось разобрать строку результата пакетного задания: {e}")
+                continue
+            
+            request = requests.get(key)
+            if request:
+                request.context.run(self._record_usage, completion.usage, settings.openai_batch_price_factor)
+            content = completion.choices[0].message.content if completion.choices else None
+            if not content:
+                continue
+            results[key] = content
+            if self.cache:
+                self.cache.set(key, self.model, content)
+        return results
@@ -1,55 +1,270 @@
-import json
 import asyncio
-from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
-from openai import RateLimitError, APIError
+import random
+import openai
+from typing import List, Dict, Any, Optional, Tuple, Callable, TypeVar
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+from openai import RateLimitError, APIError, APIConnectionError, InternalServerError, BadRequestError
 from config.settings import settings
+from services.llm_cache import get_llm_cache
+from services.rate_limiter import RateController, get_rate_controller
+from services.token_estimator import estimate_tokens, MESSAGE_OVERHEAD_TOKENS
+from services.json_stream import parse_json_response, JsonResponseError
+from services import metrics
+
+
+T = TypeVar("T")
+
+
+class ChunkTooLargeError(Exception):
+    pass
+
+
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "tasks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "description": {"type": "string"},
+                    "message_id": {"type": "integer"},
+                    "priority": {"type": "string", "enum": ["low", "medium", "high", "critical"]},
+                    "context": {"type": "string"}
+                },
+                "required": ["description", "message_id", "priority", "context"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["tasks"],
+    "additionalProperties": False
+}
+
+COMPLETION_PROPERTIES = {
+    "completed": {"type": "boolean"},
+    "response_message_id": {"type": ["integer", "null"]},
+    "evidence": {"type": "string"}
+}
+
+COMPLETION_SCHEMA = {
+    "type": "object",
+    "properties": COMPLETION_PROPERTIES,
+    "required": list(COMPLETION_PROPERTIES),
+    "additionalProperties": False
+}
+
+BATCH_COMPLETION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"task_id": {"type": "string"}, **COMPLETION_PROPERTIES},
+                "required": ["task_id", *COMPLETION_PROPERTIES],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["results"],
+    "additionalProperties": False
+}
 
 
 class OpenAIClient:
-    def __init__(self):
+    def __init__(self, rate_controller: Optional[RateController] = None):
         if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY не установлен. Добавьте его в .env файл.")
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        self.timeout = Timeout(settings.openai_timeout, connect=settings.openai_connect_timeout)
+        self.client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            timeout=self.timeout,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(timeout=self.timeout, limits=self._connection_limits())
+        )
         self.model = settings.openai_model
-        self.timeout = 300.0
         self.max_retries = 3
         self.base_delay = 2.0
+        self.temperature = 0.3
+        self.max_reasks = settings.openai_max_reasks
+        self.cache = get_llm_cache()
+        self.rate_controller = rate_controller or get_rate_controller()
+
+    @staticmethod
+    def _connection_limits():
+        connections = max(settings.openai_max_concurrency, settings.max_concurrent_requests)
+        return type(openai.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=connections,
+            max_keepalive_connections=connections,
+            keepalive_expiry=settings.openai_keepalive_expiry
+        )
 
-    async def generate(self, prompt: str, system_prompt: Optional[str] = None, retry_count: int = 0) -> str:
+    async def aclose(self):
+        await self.client.close()
+
+    async def __aenter__(self) -> "OpenAIClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    @staticmethod
+    def _build_messages(prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
         messages = []
         
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         
         messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def _cache_lookup(self, prompt: str, system_prompt: Optional[str] = None,
+                      response_format: Optional[Dict[str, Any]] = None,
+                      use_cache: bool = True) -> Tuple[Optional[str], Optional[str]]:
+        if not self.cache:
+            return None, None
+        cache_key = self.cache.make_key(self.model, system_prompt, prompt, self.temperature, response_format)
+        if settings.llm_cache_bypass or not use_cache:
+            return cache_key, None
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            metrics.record(cache_hits=1)
+        return cache_key, cached
+
+    @staticmethod
+    def _record_usage(usage: Any, price_factor: float = 1.0):
+        metrics.record(
+            llm_calls=1,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            price_factor=price_factor
+        )
+
+    @staticmethod
+    def _response_format(name: str, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not settings.openai_structured_output:
+            return None
+        return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+    async def generate(self, prompt: str, system_prompt: Optional[str] = None,
+                       response_format: Optional[Dict[str, Any]] = None, use_cache: bool = True) -> str:
+        messages = self._build_messages(prompt, system_prompt)
+        cache_key, cached = self._cache_lookup(prompt, system_prompt, response_format, use_cache)
+        if cached is not None:
+            return cached
         
-        try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.3
-            )
-            return response.choices[0].message.content or ""
-        except RateLimitError as e:
-            if retry_count < self.max_retries:
-                delay = self.base_delay * (2 ** retry_count)
-                print(f"Rate limit достигнут. Ожидание {delay:.1f} секунд перед повтором...")
-                await asyncio.sleep(delay)
-                return await self.generate(prompt, system_prompt, retry_count + 1)
-            else:
+        estimated_tokens = sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+        retry_delay = 0.0
+        
+        for attempt in range(self.max_retries + 1):
+            if retry_delay:
+                await asyncio.sleep(retry_delay)
+                retry_delay = 0.0
+            
+            ticket = await self.rate_controller.acquire(estimated_tokens)
+            used_tokens = None
+            try:
+                request = {"response_format": response_format} if response_format else {}
+                raw_response = await self.client.chat.completions.with_raw_response.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    timeout=self.timeout,
+                    **request
+                )
+                response = raw_response.parse()
+                usage = response.usage
+                used_tokens = usage.total_tokens if usage else None
+                self.rate_controller.on_success(raw_response.headers)
+            except RateLimitError as e:
+                if "insufficient_quota" in str(e).lower():
+                    metrics.record(errors=1)
+                    raise Exception(f"Превышена квота OpenAI. Пополните баланс на https://platform.openai.com/account/billing")
+                delay = self.rate_controller.on_rate_limited(ticket, e.response.headers, self._backoff(attempt))
+                if attempt < self.max_retries:
+                    metrics.record(retries=1)
+                    print(f"Rate limit достигнут. Ожидание {delay:.1f} секунд перед повтором...")
+                    continue
+                metrics.record(errors=1)
                 raise Exception(f"Превышен лимит запросов OpenAI. Проверьте квоту на https://platform.openai.com/account/billing")
-        except APIError as e:
-            if "insufficient_quota" in str(e).lower():
-                raise Exception(f"Превышена квота OpenAI. Пополните баланс на https://platform.openai.com/account/billing")
-            raise Exception(f"OpenAI API error: {e}")
-        except Exception as e:
-            raise Exception(f"OpenAI API error: {e}")
-
-    async def extract_tasks(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            except (APIConnectionError, InternalServerError) as e:
+                if attempt < self.max_retries:
+                    metrics.record(retries=1)
+                    retry_delay = self._backoff(attempt)
+                    continue
+                metrics.record(errors=1)
+                raise Exception(f"OpenAI API error: {e}")
+            except BadRequestError as e:
+                metrics.record(errors=1)
+                if e.code == "context_length_exceeded":
+                    raise ChunkTooLargeError(f"Запрос не помещается в контекст модели: {e}")
+                raise Exception(f"OpenAI API error: {e}")
+            except APIError as e:
+                metrics.record(errors=1)
+                if "insufficient_quota" in str(e).lower():
+                    raise Exception(f"Превышена квота OpenAI. Пополните баланс на https://platform.openai.com/account/billing")
+                raise Exception(f"OpenAI API error: {e}")
+            except Exception as e:
+                metrics.record(errors=1)
+                raise Exception(f"OpenAI API error: {e}")
+            finally:
+                self.rate_controller.release(ticket, used_tokens)
+            
+            self._record_usage(usage)
+            content = response.choices[0].message.content or ""
+            if cache_key and content:
+                self.cache.set(cache_key, self.model, content)
+            return content
+
+    def _backoff(self, attempt: int) -> float:
+        return self.base_delay * (2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def generate_json(self, prompt: str, system_prompt: Optional[str], schema_name: str,
+                            schema: Dict[str, Any], parse: Callable[[Any], T]) -> T:
+        response_format = self._response_format(schema_name, schema)
+        
+        for attempt in range(self.max_reasks + 1):
+            response = await self.generate(prompt, system_prompt, response_format, use_cache=attempt == 0)
+            try:
+                return parse(parse_json_response(response))
+            except JsonResponseError as e:
+                metrics.record(parse_failures=1)
+                if self.cache:
+                    self.cache.delete(self.cache.make_key(self.model, system_prompt, prompt, self.temperature,
+                                                          response_format))
+                if e.truncated:
+                    raise ChunkTooLargeError(str(e))
+                if attempt >= self.max_reasks:
+                    raise
+                metrics.record(reasks=1)
+                print(f"Некорректный ответ модели ({e}), повторный запрос...")
+
+    @staticmethod
+    def _parse_task_list(data: Any) -> List[Dict[str, Any]]:
+        tasks = data.get("tasks") if isinstance(data, dict) else data
+        if not isinstance(tasks, list) or not all(isinstance(t, dict) and "message_id" in t for t in tasks):
+            raise JsonResponseError("Ожидался список задач с полем message_id")
+        return tasks
+
+    @staticmethod
+    def _parse_completion(data: Any) -> Dict[str, Any]:
+        if not isinstance(data, dict) or not isinstance(data.get("completed"), bool):
+            raise JsonResponseError("Ожидался объект с полем completed")
+        return data
+
+    @staticmethod
+    def _parse_completion_list(data: Any) -> List[Dict[str, Any]]:
+        results = data.get("results") if isinstance(data, dict) else data
+        if not isinstance(results, list):
+            raise JsonResponseError("Ожидался список результатов проверки")
+        return [r for r in results if isinstance(r, dict)]
+
+    async def extract_tasks(self, messages: List[Dict[str, Any]], context: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
         system_prompt = """Ты — эксперт по анализу диалогов. Твоя задача — найти все требования, запросы, задачи и пожелания клиента.
 
-Верни результат в формате JSON массива, где каждый элемент:
+Верни результат в формате JSON объекта с массивом tasks, где каждый элемент:
 {
   "description": "описание задачи",
   "message_id": номер_сообщения,
@@ -57,7 +272,7 @@ class OpenAIClient:
   "context": "контекст из диалога"
 }
 
-Если задач нет — верни пустой массив [].
+Если задач нет — верни {"tasks": []}.
 
 Важно: фиксируй только реальные задачи клиента, не общие фразы."""
 
@@ -66,30 +281,21 @@ class OpenAIClient:
             for msg in messages
         ])
         
-        prompt = f"""Проанализируй диалог и найди все задачи клиента:
+        context_text = ""
+        if context:
+            context_text = "Предыдущие сообщения (только для контекста, задачи из них не извлекай):\n\n" + "\n\n".join([
+                f"[{msg['id']}] {msg['role']}: {msg['text']}"
+                for msg in context
+            ]) + "\n\n"
+        
+        prompt = f"""{context_text}Проанализируй диалог и найди все задачи клиента:
 
 {messages_text}
 
-Верни только JSON массив с задачами, без дополнительного текста."""
+Верни только JSON с задачами, без дополнительного текста."""
 
-        response = await self.generate(prompt, system_prompt)
-        
-        try:
-            cleaned_response = response.strip()
-            if cleaned_response.startswith("```json"):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.startswith("```"):
-                cleaned_response = cleaned_response[3:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-            
-            tasks = json.loads(cleaned_response)
-            if isinstance(tasks, list):
-                return tasks
-            return []
-        except Exception as e:
-            return []
+        return await self.generate_json(prompt, system_prompt, "task_extraction", EXTRACTION_SCHEMA,
+                                        self._parse_task_list)
 
     async def check_task_completion(self, task: Dict[str, Any], responses: List[Dict[str, Any]]) -> Dict[str, Any]:
         system_prompt = """Ты — эксперт по анализу выполнения задач. Определи, была ли задача выполнена разработчиком."""
@@ -118,19 +324,49 @@ class OpenAIClient:
   "evidence": "доказательство выполнения или причина пропуска"
 }}"""
 
-        response = await self.generate(prompt, system_prompt)
+        return await self.generate_json(prompt, system_prompt, "task_completion", COMPLETION_SCHEMA,
+                                        self._parse_completion)
+
+    async def check_tasks_completion_batch(self, tasks: List[Dict[str, Any]], responses: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        system_prompt = """Ты — эксперт по анализу выполнения задач. Для каждой задачи определи, была ли она выполнена разработчиком."""
+
+        local_ids = {f"T{i}": task["id"] for i, task in enumerate(tasks, 1)}
+        tasks_text = "\n\n".join([
+            f"[{local_id}] Задача: {task['description']}\nИз сообщения: {task.get('context', '')}"
+            for local_id, task in zip(local_ids, tasks)
+        ])
+        responses_text = "\n\n".join([
+            f"[{r['id']}] {r['text']}"
+            for r in responses
+        ])
         
-        try:
-            cleaned_response = response.strip()
-            if cleaned_response.startswith("```json"):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.startswith("```"):
-                cleaned_response = cleaned_response[3:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-            
-            result = json.loads(cleaned_response)
-            return result
-        except Exception as e:
-            return {"completed": False, "response_message_id": None, "evidence": "Не удалось определить"}
+        prompt = f"""Задачи клиента:
+{tasks_text}
+
+Ответы разработчика:
+{responses_text}
+
+Для каждой задачи определи:
+1. Была ли задача выполнена? (true/false)
+2. Если да — в каком сообщении есть подтверждение?
+3. Если нет — почему?
+
+Верни JSON объект с массивом results, по одному элементу на каждую задачу:
+{{
+  "results": [
+    {{
+      "task_id": "T1",
+      "completed": true/false,
+      "response_message_id": номер_или_null,
+      "evidence": "доказательство выполнения или причина пропуска"
+    }}
+  ]
+}}"""
+
+        results = await self.generate_json(prompt, system_prompt, "task_completion_batch", BATCH_COMPLETION_SCHEMA,
+                                           self._parse_completion_list)
+        return {
+            local_ids[str(result.get("task_id"))]: result
+            for result in results
+            if str(result.get("task_id")) in local_ids
+        }
@@ -0,0 +1,113 @@
+import asyncio
+import glob
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from services.chat_parser import ChatParser
+from config.settings import settings
+
+
+def is_pattern(identifier: str) -> bool:
+    return any(char in identifier for char in "*?[")
+
+
+def expand_paths(identifier: str) -> List[Path]:
+    path = Path(identifier)
+    if path.is_dir():
+        candidates = path.rglob("*")
+    elif is_pattern(identifier):
+        candidates = (Path(p) for p in glob.glob(identifier, recursive=True))
+    else:
+        return [path]
+    return sorted(p for p in candidates if p.suffix in ChatParser.SUPPORTED_SUFFIXES and p.is_file())
+
+
+def unique_chat_ids(paths: Iterable[Path]) -> Dict[Path, str]:
+    paths = list(paths)
+    stems = Counter(p.stem for p in paths)
+    root = Path(os.path.commonpath([str(p.parent.resolve()) for p in paths])) if paths else Path(".")
+    chat_ids = {}
+    for path in paths:
+        if stems[path.stem] == 1:
+            chat_ids[path] = path.stem
+        else:
+            relative = path.resolve().relative_to(root).with_suffix("")
+            chat_ids[path] = "_".join(relative.parts)
+    return chat_ids
+
+
+def _parse_timed(path: Path) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    session = ChatParser.parse_file(path)
+    return session, time.perf_counter() - started
+
+
+class ParseStats:
+    def __init__(self):
+        self.files = 0
+        self.failed = 0
+        self.messages = 0
+        self.bytes = 0
+        self.cpu_time = 0.0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def add(self, path: Path, session, elapsed: float):
+        self.files += 1
+        self.messages += session.total_messages
+        self.bytes += path.stat().st_size
+        self.cpu_time += elapsed
+
+    @property
+    def wall_time(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self) -> str:
+        wall_time = self.wall_time or 1e-9
+        failed = f", с ошибками {self.failed}" if self.failed else ""
+        return (f"Разобрано файлов: {self.files}{failed}, сообщений: {self.messages}, "
+                f"{self.bytes / 2**20:.1f} МБ за {wall_time:.2f} с: "
+                f"{self.files / wall_time:.1f} файлов/с, {self.messages / wall_time:.0f} сообщений/с "
+                f"(время разбора в процессах: {self.cpu_time:.2f} с)")
+
+
+async def iter_parsed_files(paths: Iterable[Path], stats: Optional[ParseStats] = None, workers: Optional[int] = None,
+                            prefetch: Optional[int] = None) -> AsyncIterator[Tuple[Path, Any, float, Optional[Exception]]]:
+    loop = asyncio.get_running_loop()
+    workers = workers or settings.parse_workers or os.cpu_count() or 1
+    prefetch = prefetch or settings.parse_prefetch_files or workers * 2
+    stats = stats or ParseStats()
+    remaining = iter(paths)
+    pending: Dict[asyncio.Future, Path] = {}
+    pool = ProcessPoolExecutor(max_workers=workers)
+
+    def submit():
+        path = next(remaining, None)
+        if path is not None:
+            pending[loop.run_in_executor(pool, _parse_timed, path)] = path
+    
+    try:
+        for _ in range(prefetch):
+            submit()
+        
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: str(pending[f])):
+                path = pending.pop(future)
+                submit()
+                if not pending:
+                    stats.finished = time.perf_counter()
+                try:
+                    session, elapsed = future.result()
+                except Exception as e:
+                    stats.failed += 1
+                    yield path, None, 0.0, e
+                    continue
+                stats.add(path, session, elapsed)
+                yield path, session, elapsed, None
+    finally:
+        stats.finished = stats.finished or time.perf_counter()
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,199 @@
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Deque, Mapping, Optional
+from config.settings import settings
+
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    if not headers:
+        return None
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return float(retry_ms) / 1000
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+
+class TokenBucket:
+    def __init__(self, per_minute: Optional[float] = None):
+        self.capacity = per_minute
+        self.level = per_minute or 0.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def clamp(self, amount: float) -> float:
+        return min(amount, self.capacity) if self.capacity else amount
+
+    def wait_time(self, amount: float) -> float:
+        if not self.capacity:
+            return 0.0
+        missing = self.clamp(amount) - self.level
+        return missing * 60 / self.capacity if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= amount
+
+    def set_capacity(self, per_minute: float):
+        if self.capacity is None:
+            self.level = per_minute
+        else:
+            self.level = min(self.level, per_minute)
+        self.capacity = per_minute
+
+    def sync_remaining(self, remaining: Optional[int]):
+        if self.capacity and remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+class RateTicket:
+    __slots__ = ("epoch", "tokens")
+
+    def __init__(self, epoch: int, tokens: float):
+        self.epoch = epoch
+        self.tokens = tokens
+
+
+class RateController:
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None,
+                 initial_concurrency: Optional[int] = None, max_concurrency: Optional[int] = None,
+                 headroom: Optional[float] = None):
+        self.headroom = headroom if headroom is not None else settings.openai_rate_limit_headroom
+        self.requests_per_minute = requests_per_minute or settings.openai_requests_per_minute
+        self.tokens_per_minute = tokens_per_minute or settings.openai_tokens_per_minute
+        self.requests = TokenBucket(self.requests_per_minute * self.headroom if self.requests_per_minute else None)
+        self.tokens = TokenBucket(self.tokens_per_minute * self.headroom if self.tokens_per_minute else None)
+        
+        self.max_concurrency = max_concurrency or settings.openai_max_concurrency
+        self.concurrency = float(min(initial_concurrency or settings.max_concurrent_requests, self.max_concurrency))
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.epoch = 0
+        self.rate_limited = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self.concurrency))
+
+    async def acquire(self, estimated_tokens: int = 0) -> RateTicket:
+        while True:
+            if self.in_flight >= self.limit:
+                await self._wait_for_slot()
+                continue
+            
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.blocked_until - now, self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+            if wait <= 0:
+                tokens = self.tokens.clamp(estimated_tokens)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self.in_flight += 1
+                return RateTicket(self.epoch, tokens)
+            
+            await asyncio.sleep(wait)
+
+    def release(self, ticket: RateTicket, used_tokens: Optional[int] = None):
+        self.in_flight -= 1
+        if used_tokens is not None:
+            self.tokens.take(used_tokens - ticket.tokens)
+        self._wake()
+
+    def on_success(self, headers: Optional[Mapping[str, str]] = None):
+        if headers:
+            self._apply_headers(headers)
+        if self.concurrency < self.max_concurrency:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self._wake()
+
+    def on_rate_limited(self, ticket: RateTicket, headers: Optional[Mapping[str, str]], fallback_delay: float) -> float:
+        self.rate_limited += 1
+        if headers:
+            self._apply_headers(headers)
+        
+        delay = retry_after(headers)
+        if delay is None:
+            delay = fallback_delay
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        
+        if ticket.epoch == self.epoch:
+            self.epoch += 1
+            self.concurrency = max(1.0, self.concurrency / 2)
+        
+        return delay
+
+    def _apply_headers(self, headers: Mapping[str, str]):
+        now = time.monotonic()
+        for bucket, configured, kind in ((self.requests, self.requests_per_minute, "requests"),
+                                         (self.tokens, self.tokens_per_minute, "tokens")):
+            limit = _header_int(headers, f"x-ratelimit-limit-{kind}")
+            if limit and not configured:
+                bucket.refill(now)
+                bucket.set_capacity(limit * self.headroom)
+            bucket.sync_remaining(_header_int(headers, f"x-ratelimit-remaining-{kind}"))
+
+    async def _wait_for_slot(self):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._wake()
+            raise
+        finally:
+            if not waiter.done():
+                self._waiters.remove(waiter)
+
+    def _wake(self):
+        free = self.limit - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+_controller: Optional[RateController] = None
+
+
+def get_rate_controller() -> RateController:
+    global _controller
+    if _controller is None:
+        _controller = RateController()
+    return _controller
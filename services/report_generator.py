@@ -1,9 +1,9 @@
-import json
 from pathlib import Path
 from datetime import datetime
 from typing import List
 from models.task import Task, TaskStatus
-from models.report import AnalysisReport, ReportSummary
+from models.report import AnalysisReport, ReportSummary, BatchChatResult, BatchSummary
+from services.report_writer import open_report_file, write_json_array_document, write_ndjson_document
 from config.settings import settings
 
 
@@ -12,36 +12,41 @@ class ReportGenerator:
         self.reports_path = settings.reports_path
 
     def generate(self, chat_id: str, chat_title: str, tasks: List[Task]) -> AnalysisReport:
-        missed_tasks = [t for t in tasks if t.status == TaskStatus.MISSED]
-        completed_tasks = [t for t in tasks if t.status == TaskStatus.COMPLETED]
-        pending_tasks = [t for t in tasks if t.status == TaskStatus.PENDING]
-        in_progress_tasks = [t for t in tasks if t.status == TaskStatus.IN_PROGRESS]
+        summary = ReportSummary(total_tasks=len(tasks))
+        missed_task_ids = []
         
-        summary = ReportSummary(
-            total_tasks=len(tasks),
-            completed_tasks=len(completed_tasks),
-            pending_tasks=len(pending_tasks),
-            missed_tasks=len(missed_tasks),
-            in_progress_tasks=len(in_progress_tasks)
-        )
+        for task in tasks:
+            if task.status == TaskStatus.MISSED:
+                summary.missed_tasks += 1
+                missed_task_ids.append(task.id)
+            elif task.status == TaskStatus.COMPLETED:
+                summary.completed_tasks += 1
+            elif task.status == TaskStatus.PENDING:
+                summary.pending_tasks += 1
+            elif task.status == TaskStatus.IN_PROGRESS:
+                summary.in_progress_tasks += 1
         
         report = AnalysisReport(
             chat_id=chat_id,
             chat_title=chat_title,
             summary=summary,
             tasks=tasks,
-            missed_tasks=missed_tasks
+            missed_task_ids=missed_task_ids
         )
         
         return report
 
     def save_json(self, report: AnalysisReport) -> Path:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"report_{report.chat_id}_{timestamp}.json"
-        filepath = self.reports_path / filename
+        ndjson = settings.report_format == "ndjson"
+        filepath = self.reports_path / f"report_{report.chat_id}_{timestamp}.{'ndjson' if ndjson else 'json'}"
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(report.model_dump(mode='json'), f, ensure_ascii=False, indent=2, default=str)
+        f, filepath = open_report_file(filepath)
+        with f:
+            if ndjson:
+                write_ndjson_document(f, report, "tasks", report.tasks)
+            else:
+                write_json_array_document(f, report, "tasks", report.tasks)
         
         return filepath
 
@@ -65,18 +70,22 @@ class ReportGenerator:
             f.write(f"Ожидают: {report.summary.pending_tasks}\n")
             f.write(f"Пропущено: {report.summary.missed_tasks}\n\n")
             
-            if report.missed_tasks:
+            missed_tasks = report.missed_tasks
+            if missed_tasks:
                 f.write("=" * 80 + "\n")
                 f.write("ПРОПУЩЕННЫЕ ЗАДАЧИ:\n")
                 f.write("=" * 80 + "\n\n")
                 
-                for i, task in enumerate(report.missed_tasks, 1):
+                for i, task in enumerate(missed_tasks, 1):
                     f.write(f"{i}. ЗАДАЧА #{task.id}\n")
                     f.write(f"   Описание: {task.description}\n")
                     f.write(f"   Приоритет: {task.priority.value}\n")
                     f.write(f"   Сообщение #{task.source_message_id}: {task.source_message_text[:100]}...\n")
                     f.write(f"   Причина пропуска: {task.missed_reason or 'Не указана'}\n")
                     f.write(f"   Запрошено: {task.requested_at.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                    if len(task.source_message_ids) > 1:
+                        repeats = ", ".join(f"#{message_id}" for message_id in task.source_message_ids[1:])
+                        f.write(f"   Повторные запросы: {repeats}\n")
                     if task.context:
                         f.write(f"   Контекст: {task.context}\n")
                     f.write("\n")
@@ -88,6 +97,9 @@ class ReportGenerator:
             for i, task in enumerate(report.tasks, 1):
                 f.write(f"{i}. [{task.status.value.upper()}] {task.description}\n")
                 f.write(f"   Сообщение #{task.source_message_id}\n")
+                if len(task.source_message_ids) > 1:
+                    repeats = ", ".join(f"#{message_id}" for message_id in task.source_message_ids[1:])
+                    f.write(f"   Повторные запросы: {repeats}\n")
                 if task.status == TaskStatus.COMPLETED and task.completion_evidence:
                     f.write(f"   Выполнено: {task.completion_evidence}\n")
                 elif task.status == TaskStatus.MISSED:
@@ -96,3 +108,65 @@ class ReportGenerator:
         
         return filepath
 
+    def generate_batch_summary(self, results: List[BatchChatResult]) -> BatchSummary:
+        total = ReportSummary()
+        for result in results:
+            if not result.summary:
+                continue
+            total.total_tasks += result.summary.total_tasks
+            total.completed_tasks += result.summary.completed_tasks
+            total.pending_tasks += result.summary.pending_tasks
+            total.missed_tasks += result.summary.missed_tasks
+            total.in_progress_tasks += result.summary.in_progress_tasks
+        
+        return BatchSummary(total=total, chats=results)
+
+    def save_batch_summary_json(self, summary: BatchSummary) -> Path:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        ndjson = settings.report_format == "ndjson"
+        filepath = self.reports_path / f"batch_summary_{timestamp}.{'ndjson' if ndjson else 'json'}"
+        
+        f, filepath = open_report_file(filepath)
+        with f:
+            if ndjson:
+                write_ndjson_document(f, summary, "chats", summary.chats)
+            else:
+                write_json_array_document(f, summary, "chats", summary.chats)
+        
+        return filepath
+
+    def save_batch_summary_txt(self, summary: BatchSummary) -> Path:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = self.reports_path / f"batch_summary_{timestamp}.txt"
+        
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write("=" * 80 + "\n")
+            f.write("СВОДНЫЙ ОТЧЕТ ПО ЧАТАМ\n")
+            f.write("=" * 80 + "\n\n")
+            f.write(f"Дата: {summary.generated_at.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"Чатов: {len(summary.chats)}\n\n")
+            
+            f.write("ИТОГО:\n")
+            f.write("-" * 80 + "\n")
+            f.write(f"Всего задач: {summary.total.total_tasks}\n")
+            f.write(f"Выполнено: {summary.total.completed_tasks}\n")
+            f.write(f"В процессе: {summary.total.in_progress_tasks}\n")
+            f.write(f"Ожидают: {summary.total.pending_tasks}\n")
+            f.write(f"Пропущено: {summary.total.missed_tasks}\n\n")
+            
+            f.write("=" * 80 + "\n")
+            f.write("ЧАТЫ:\n")
+            f.write("=" * 80 + "\n\n")
+            
+            for i, result in enumerate(summary.chats, 1):
+                f.write(f"{i}. {result.chat_title or result.chat_id or result.identifier}\n")
+                if result.error:
+                    f.write(f"   Ошибка: {result.error}\n")
+                elif result.summary:
+                    f.write(f"   Задач: {result.summary.total_tasks}, выполнено: {result.summary.completed_tasks}, "
+                            f"пропущено: {result.summary.missed_tasks}\n")
+                else:
+                    f.write("   Задачи не найдены\n")
+                f.write("\n")
+        
+        return filepath
@@ -0,0 +1,66 @@
+import gzip
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional, Set, Tuple
+from pydantic import BaseModel
+from config.settings import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def _use_orjson() -> bool:
+    return orjson is not None and settings.report_json_backend != "json"
+
+
+def dumps_model(model: BaseModel, exclude: Optional[Set[str]] = None) -> bytes:
+    if _use_orjson():
+        return orjson.dumps(model.model_dump(exclude=exclude))
+    return model.model_dump_json(exclude=exclude).encode("utf-8")
+
+
+def open_report_file(filepath: Path, compression: Optional[str] = None) -> Tuple[BinaryIO, Path]:
+    compression = compression if compression is not None else settings.report_compression
+    if not compression:
+        return open(filepath, "wb"), filepath
+    
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Неизвестный формат сжатия отчетов: {compression} (доступны: gzip, zstd)")
+    filepath = filepath.with_name(filepath.name + COMPRESSION_SUFFIXES[compression])
+    
+    if compression == "gzip":
+        return gzip.open(filepath, "wb", compresslevel=6), filepath
+    
+    try:
+        from compression import zstd
+        return zstd.open(filepath, "wb"), filepath
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Для сжатия zstd установите пакет zstandard: pip install zstandard")
+    return zstandard.ZstdCompressor().stream_writer(open(filepath, "wb")), filepath
+
+
+def write_json_array_document(fp: BinaryIO, header: BaseModel, key: str, items: Iterable[BaseModel]):
+    fp.write(dumps_model(header, exclude={key})[:-1])
+    fp.write(b',"' + key.encode("utf-8") + b'":[')
+    separator = b"\n"
+    for item in items:
+        fp.write(separator)
+        fp.write(dumps_model(item))
+        separator = b",\n"
+    fp.write(b"\n]}\n")
+
+
+def write_ndjson_document(fp: BinaryIO, header: BaseModel, key: str, items: Iterable[BaseModel]):
+    fp.write(dumps_model(header, exclude={key}))
+    fp.write(b"\n")
+    for item in items:
+        fp.write(dumps_model(item))
+        fp.write(b"\n")
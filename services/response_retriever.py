@@ -0,0 +1,88 @@
+import heapq
+import math
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from config.settings import settings
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+Vector = Dict[str, float]
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        if word.isdigit() or len(word) <= 3:
+            tokens.append(word)
+        elif len(word) <= 5:
+            tokens.append(word[:4])
+        else:
+            tokens.append(word[:5])
+    return tokens
+
+
+class ResponseRetriever:
+    def __init__(self, session, top_k: Optional[int] = None, recent: Optional[int] = None,
+                 search_messages: Optional[int] = None):
+        self.session = session
+        self.top_k = top_k or settings.response_top_k
+        self.recent = recent if recent is not None else settings.response_recent_messages
+        self.search_messages = search_messages or settings.response_search_messages
+        self._idf: Optional[Dict[str, float]] = None
+        self._vectors: Dict[int, Vector] = {}
+
+    def _build_idf(self):
+        document_frequency: Counter = Counter()
+        documents = 0
+        for msg in self.session.developer_messages_after(-1):
+            document_frequency.update(set(tokenize(msg.text)))
+            documents += 1
+        self._idf = {term: math.log((1 + documents) / (1 + count)) + 1 for term, count in document_frequency.items()}
+
+    def vectorize(self, text: str) -> Vector:
+        if self._idf is None:
+            self._build_idf()
+        weights = {}
+        for term, count in Counter(tokenize(text)).items():
+            idf = self._idf.get(term)
+            if idf:
+                weights[term] = (1 + math.log(count)) * idf
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        return {term: w / norm for term, w in weights.items()} if norm else {}
+
+    def _message_vector(self, msg) -> Vector:
+        vector = self._vectors.get(msg.id)
+        if vector is None:
+            vector = self._vectors[msg.id] = self.vectorize(msg.text)
+        return vector
+
+    @staticmethod
+    def similarity(query: Vector, vector: Vector) -> float:
+        if len(vector) < len(query):
+            query, vector = vector, query
+        return sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+
+    def retrieve(self, query_text: str, position: int, until: Optional[datetime] = None,
+                 reply_to: Optional[int] = None) -> List[Any]:
+        candidates = self.session.developer_messages_after(position, self.search_messages, until)
+        if len(candidates) <= self.recent + self.top_k:
+            return candidates
+        
+        selected = {msg.id: msg for msg in candidates[:self.recent]}
+        if reply_to is not None:
+            for msg in candidates:
+                if msg.reply_to_message_id == reply_to:
+                    selected[msg.id] = msg
+        
+        query = self.vectorize(query_text)
+        if query:
+            scored = ((self.similarity(query, self._message_vector(msg)), -i, msg)
+                      for i, msg in enumerate(candidates) if msg.id not in selected)
+            for score, _, msg in heapq.nlargest(self.top_k, scored, key=lambda item: item[:2]):
+                if score > 0:
+                    selected[msg.id] = msg
+        
+        return sorted(selected.values(), key=lambda msg: msg.id)
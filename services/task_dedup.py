@@ -0,0 +1,157 @@
+import heapq
+import re
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from models.task import Task, TaskPriority
+from config.settings import settings
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_NUMBER = re.compile(r"\d+")
+
+_PRIORITY_RANK = {TaskPriority.LOW: 0, TaskPriority.MEDIUM: 1, TaskPriority.HIGH: 2, TaskPriority.CRITICAL: 3}
+
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    normalized = " ".join(_WORD.findall(text.lower()))
+    if len(normalized) <= size:
+        return {zlib.crc32(normalized.encode("utf-8"))} if normalized else set()
+    return {zlib.crc32(normalized[i:i + size].encode("utf-8")) for i in range(len(normalized) - size + 1)}
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a or not b:
+        return 0.0
+    common = len(a & b) if len(a) < len(b) else len(b & a)
+    return common / (len(a) + len(b) - common)
+
+
+class MinHashLSH:
+    def __init__(self, bands: int = 16, rows: int = 4):
+        self.bands = bands
+        self.rows = rows
+        self.bins = bands * rows
+        self.buckets: Dict[Tuple, Dict[int, None]] = {}
+
+    def signature(self, hashes: Iterable[int]) -> List[Optional[int]]:
+        signature: List[Optional[int]] = [None] * self.bins
+        for value in hashes:
+            index, value = value % self.bins, value // self.bins
+            current = signature[index]
+            if current is None or value < current:
+                signature[index] = value
+        return signature
+
+    def _keys(self, signature: List[Optional[int]], partition: Tuple) -> Iterable[Tuple]:
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            if any(value is not None for value in values):
+                yield (partition, band, *values)
+
+    def add(self, item: int, signature: List[Optional[int]], partition: Tuple = ()):
+        for key in self._keys(signature, partition):
+            self.buckets.setdefault(key, {})[item] = None
+
+    def remove(self, item: int, signature: List[Optional[int]], partition: Tuple = ()):
+        for key in self._keys(signature, partition):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.pop(item, None)
+                if not bucket:
+                    del self.buckets[key]
+
+    def candidates(self, signature: List[Optional[int]], partition: Tuple = ()) -> List[int]:
+        found = set()
+        for key in self._keys(signature, partition):
+            found.update(self.buckets.get(key, ()))
+        return sorted(found)
+
+
+class TaskDeduplicator:
+    def __init__(self, threshold: Optional[float] = None, window_hours: Optional[float] = None):
+        self.threshold = threshold if threshold is not None else settings.task_dedup_threshold
+        window_hours = window_hours if window_hours is not None else settings.task_dedup_window_hours
+        self.window = timedelta(hours=window_hours) if window_hours else None
+        self.index = MinHashLSH()
+        self.tasks: List[Task] = []
+        self._shingles: List[Optional[Set[int]]] = []
+        self._signatures: List[Optional[Tuple[List[Optional[int]], Tuple]]] = []
+        self._last_seen: List[datetime] = []
+        self._expiry: List[Tuple[datetime, int]] = []
+        self._updated: Dict[int, None] = {}
+        self.merged = 0
+
+    @staticmethod
+    def _features(task: Task) -> Tuple[Set[int], Tuple]:
+        numbers = tuple(sorted(set(_NUMBER.findall(task.description))))
+        return shingles(f"{task.description} {task.context or ''}"), numbers
+
+    def register(self, tasks: Iterable[Task]):
+        for task in tasks:
+            task_shingles, numbers = self._features(task)
+            self._register(task, task_shingles, self.index.signature(task_shingles), numbers)
+
+    def add(self, tasks: Iterable[Task]) -> List[Task]:
+        unique = []
+        for task in tasks:
+            task_shingles, numbers = self._features(task)
+            signature = self.index.signature(task_shingles)
+            self._evict_before(task.requested_at)
+            duplicate = self._find_duplicate(task, task_shingles, signature, numbers)
+            if duplicate is None:
+                self._register(task, task_shingles, signature, numbers)
+                unique.append(task)
+            else:
+                self._merge(duplicate, task)
+        return unique
+
+    def pop_updated(self) -> List[Task]:
+        updated, self._updated = self._updated, {}
+        return [self.tasks[index] for index in updated]
+
+    def _register(self, task: Task, task_shingles: Set[int], signature: List[Optional[int]], numbers: Tuple):
+        index = len(self.tasks)
+        self.index.add(index, signature, numbers)
+        self.tasks.append(task)
+        self._shingles.append(task_shingles)
+        self._signatures.append((signature, numbers))
+        self._last_seen.append(task.requested_at)
+        if self.window:
+            heapq.heappush(self._expiry, (task.requested_at, index))
+
+    def _evict_before(self, now: datetime):
+        if not self.window:
+            return
+        while self._expiry and self._expiry[0][0] < now - self.window:
+            seen, index = heapq.heappop(self._expiry)
+            if self._last_seen[index] != seen:
+                heapq.heappush(self._expiry, (self._last_seen[index], index))
+                continue
+            self.index.remove(index, *self._signatures[index])
+            self._shingles[index] = None
+            self._signatures[index] = None
+
+    def _find_duplicate(self, task: Task, task_shingles: Set[int], signature: List[Optional[int]],
+                        numbers: Tuple) -> Optional[int]:
+        best, best_score = None, 0.0
+        for candidate in self.index.candidates(signature, numbers):
+            if task.source_message_id in self.tasks[candidate].source_message_ids:
+                continue
+            if self.window and abs(task.requested_at - self._last_seen[candidate]) > self.window:
+                continue
+            score = jaccard(task_shingles, self._shingles[candidate])
+            if score >= self.threshold and score > best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _merge(self, index: int, duplicate: Task):
+        task = self.tasks[index]
+        for message_id in duplicate.source_message_ids:
+            if message_id not in task.source_message_ids:
+                task.source_message_ids.append(message_id)
+        if _PRIORITY_RANK[duplicate.priority] > _PRIORITY_RANK[task.priority]:
+            task.priority = duplicate.priority
+        self._last_seen[index] = max(self._last_seen[index], duplicate.requested_at)
+        self._updated[index] = None
+        self.merged += 1
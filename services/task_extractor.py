@@ -1,16 +1,27 @@
 import asyncio
-from typing import List, Dict, Any
+import contextlib
+from typing import List, Dict, Any, Optional, Callable, Awaitable, AsyncContextManager
 from datetime import datetime
 from models.chat import ChatSession, ChatMessage
 from models.task import Task, TaskStatus, TaskPriority
-from services.openai_client import OpenAIClient
+from services.openai_client import OpenAIClient, ChunkTooLargeError
+from services.token_estimator import estimate_message_tokens
+from services.message_filter import MessagePreFilter
+from services import metrics
+from config.settings import settings
+
+
+TasksCallback = Callable[[int, List[Task]], Awaitable[None]]
 
 
 class TaskExtractor:
-    def __init__(self):
-        self.ai_client = OpenAIClient()
+    def __init__(self, ai_client: Optional[OpenAIClient] = None):
+        self.ai_client = ai_client or OpenAIClient()
+        self.failed_chunks: List[str] = []
+        self.prefilter = MessagePreFilter() if settings.prefilter_enabled else None
 
-    async def extract_tasks(self, session: ChatSession) -> List[Task]:
+    async def extract_tasks(self, session: ChatSession, after_message_id: Optional[int] = None,
+                            on_tasks: Optional[TasksCallback] = None) -> List[Task]:
         messages_data = []
         for msg in session.messages:
             if msg.role.value == "client":
@@ -20,55 +31,150 @@ class TaskExtractor:
                     "text": msg.text
                 })
         
-        if not messages_data:
+        start = 0
+        if after_message_id is not None:
+            start = next((i for i, m in enumerate(messages_data) if m["id"] > after_message_id), len(messages_data))
+        
+        if start >= len(messages_data):
             return []
         
-        chunks = self._chunk_messages(messages_data, chunk_size=30)
-        all_tasks = []
+        context = messages_data[max(0, start - settings.chunk_overlap):start]
+        new_messages = messages_data[start:]
+        
+        if self.prefilter:
+            new_messages = self.prefilter.filter(new_messages)
+            print(f"Предфильтр: отброшено сообщений без задач: {self.prefilter.removed_messages} "
+                  f"(~{self.prefilter.removed_tokens} токенов), осталось: {len(new_messages)}")
+            if not new_messages:
+                return []
+        
+        chunks = self._chunk_messages(
+            context + new_messages, settings.chunk_size, settings.chunk_overlap, len(context)
+        )
         total_chunks = len(chunks)
+        self.failed_chunks = []
+        window = contextlib.nullcontext()
+        if on_tasks:
+            window = asyncio.Semaphore(settings.openai_max_concurrency + settings.pipeline_queue_size)
         
         print(f"Обработка {total_chunks} частей чата...")
         
-        for i, chunk in enumerate(chunks, 1):
+        results = await asyncio.gather(
+            *(self._extract_chunk(session, chunk, i, total_chunks, window, on_tasks) for i, chunk in enumerate(chunks, 1)),
+            return_exceptions=True
+        )
+        
+        all_tasks = []
+        for i, tasks in enumerate(results, 1):
+            if isinstance(tasks, BaseException):
+                self.failed_chunks.append(f"{i}")
+                continue
+            all_tasks.extend(tasks)
+        
+        if self.failed_chunks:
+            failed = ", ".join(self.failed_chunks)
+            print(f"Не удалось обработать частей: {len(self.failed_chunks)} из {total_chunks} ({failed})")
+        
+        return all_tasks
+
+    async def _extract_chunk(self, session: ChatSession, chunk: Dict[str, List[Dict]], index: int, total_chunks: int,
+                             window: AsyncContextManager, on_tasks: Optional[TasksCallback] = None) -> List[Task]:
+        async with window:
             try:
-                print(f"  Часть {i}/{total_chunks}...", end=" ", flush=True)
-                tasks_data = await self.ai_client.extract_tasks(chunk)
-                print(f"найдено задач: {len(tasks_data)}")
-                
-                for task_data in tasks_data:
-                    message_id = task_data.get("message_id", 0)
-                    source_msg = next((m for m in session.messages if m.id == message_id), None)
-                    
-                    if not source_msg:
-                        continue
-                    
-                    priority_str = task_data.get("priority", "medium").lower()
-                    try:
-                        priority = TaskPriority(priority_str)
-                    except:
-                        priority = TaskPriority.MEDIUM
-                    
-                    task = Task(
-                        id=f"{session.chat_id}_{message_id}_{len(all_tasks)}",
-                        description=task_data.get("description", ""),
-                        source_message_id=message_id,
-                        source_message_text=source_msg.text,
-                        status=TaskStatus.PENDING,
-                        priority=priority,
-                        requested_at=source_msg.timestamp,
-                        context=task_data.get("context", "")
-                    )
-                    all_tasks.append(task)
-                
-                await asyncio.sleep(0.5)
+                tasks_data = await self._extract_with_bisect(chunk, str(index), total_chunks)
+                print(f"  Часть {index}/{total_chunks}: найдено задач: {len(tasks_data)}")
+                tasks = self._build_tasks(session, chunk, tasks_data)
             except Exception as e:
-                print(f"Ошибка при обработке части {i}: {e}")
+                print(f"  Часть {index}/{total_chunks}: ошибка: {e}")
+                if on_tasks:
+                    await on_tasks(index, [])
+                raise
+            
+            if on_tasks:
+                await on_tasks(index, tasks)
+            return tasks
+
+    def _build_tasks(self, session: ChatSession, chunk: Dict[str, List[Dict]], tasks_data: List[Dict[str, Any]]) -> List[Task]:
+        chunk_ids = {m["id"] for m in chunk["messages"]}
+        per_message: Dict[int, int] = {}
+        tasks = []
+        for task_data in tasks_data:
+            message_id = task_data.get("message_id", 0)
+            if message_id not in chunk_ids:
                 continue
+            source_msg = session.get_message(message_id)
+            
+            if not source_msg:
+                continue
+            
+            priority_str = task_data.get("priority", "medium").lower()
+            try:
+                priority = TaskPriority(priority_str)
+            except:
+                priority = TaskPriority.MEDIUM
+            
+            number = per_message.get(message_id, 0)
+            per_message[message_id] = number + 1
+            task = Task(
+                id=f"{session.chat_id}_{message_id}_{number}",
+                description=task_data.get("description", ""),
+                source_message_id=message_id,
+                source_message_text=source_msg.text,
+                status=TaskStatus.PENDING,
+                priority=priority,
+                requested_at=source_msg.timestamp,
+                context=task_data.get("context", "")
+            )
+            tasks.append(task)
+        return tasks
+
+    async def _extract_with_bisect(self, chunk: Dict[str, List[Dict]], path: str, total_chunks: int) -> List[Dict[str, Any]]:
+        try:
+            return await self.ai_client.extract_tasks(chunk["messages"], chunk["context"])
+        except ChunkTooLargeError as e:
+            messages = chunk["messages"]
+            if len(messages) < 2:
+                raise
+            middle = len(messages) // 2
+            metrics.record(bisections=1)
+            print(f"  Часть {path}/{total_chunks}: {e}, делим на части по {middle} и {len(messages) - middle} сообщений")
         
-        return all_tasks
+        overlap = settings.chunk_overlap
+        halves = {
+            f"{path}.1": {"context": chunk["context"], "messages": messages[:middle]},
+            f"{path}.2": {"context": (chunk["context"] + messages[:middle])[-overlap:] if overlap else [],
+                          "messages": messages[middle:]}
+        }
+        results = await asyncio.gather(
+            *(self._extract_with_bisect(half, half_path, total_chunks) for half_path, half in halves.items()),
+            return_exceptions=True
+        )
+        
+        tasks_data = []
+        for half_path, result in zip(halves, results):
+            if isinstance(result, BaseException):
+                print(f"  Часть {half_path}/{total_chunks}: ошибка: {result}")
+                self.failed_chunks.append(half_path)
+                continue
+            tasks_data.extend(result)
+        return tasks_data
 
-    def _chunk_messages(self, messages: List[Dict], chunk_size: int) -> List[List[Dict]]:
+    def _chunk_messages(self, messages: List[Dict], token_budget: int, overlap: int = 0, start: int = 0) -> List[Dict[str, List[Dict]]]:
         chunks = []
-        for i in range(0, len(messages), chunk_size):
-            chunks.append(messages[i:i + chunk_size])
+        sizes = [estimate_message_tokens(m) for m in messages]
+        
+        while start < len(messages):
+            context_start = max(0, start - overlap)
+            used = sum(sizes[context_start:start])
+            end = start
+            while end < len(messages) and (end == start or used + sizes[end] <= token_budget):
+                used += sizes[end]
+                end += 1
+            
+            chunks.append({
+                "context": messages[context_start:start],
+                "messages": messages[start:end]
+            })
+            start = end
+        
         return chunks
@@ -1,81 +1,221 @@
 import asyncio
-from typing import List
-from models.chat import ChatSession, ChatMessage, MessageRole
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple
+from models.chat import ChatSession, ChatMessage
 from models.task import Task, TaskStatus
 from services.openai_client import OpenAIClient
+from services.response_retriever import ResponseRetriever
+from config.settings import settings
+
+
+PendingCheck = Tuple[Task, List[ChatMessage], str]
 
 
 class TaskMatcher:
-    def __init__(self):
-        self.ai_client = OpenAIClient()
+    def __init__(self, ai_client: Optional[OpenAIClient] = None, batch_size: Optional[int] = None,
+                 window_messages: Optional[int] = None, window_hours: Optional[float] = None):
+        self.ai_client = ai_client or OpenAIClient()
+        self.batch_size = batch_size or settings.match_batch_size
+        self.window_messages = window_messages or settings.response_window_messages
+        self.window_hours = window_hours if window_hours is not None else settings.response_window_hours
+        self.retriever: Optional[ResponseRetriever] = None
+        self.streamed_tasks = 0
 
     async def match_tasks_with_responses(self, session: ChatSession, tasks: List[Task]) -> List[Task]:
         total_tasks = len(tasks)
         print(f"Проверка выполнения {total_tasks} задач...")
         
-        for i, task in enumerate(tasks, 1):
+        await self._run_checks(session, tasks)
+        
+        return tasks
+
+    async def recheck_open_tasks(self, session: ChatSession, tasks: List[Task], after_message_id: int) -> List[Task]:
+        open_tasks = [t for t in tasks if t.status in (TaskStatus.MISSED, TaskStatus.PENDING)]
+        print(f"Повторная проверка {len(open_tasks)} незакрытых задач по новым сообщениям...")
+        
+        await self._run_checks(session, open_tasks, after_message_id)
+        
+        return tasks
+
+    async def consume(self, session: ChatSession, queue: "asyncio.Queue[Optional[List[Task]]]"):
+        finished = False
+        while not finished:
+            tasks: List[Task] = []
+            item = await queue.get()
+            while True:
+                if item is None:
+                    finished = True
+                    break
+                tasks.extend(item)
+                if queue.empty():
+                    break
+                item = queue.get_nowait()
+            
+            tasks = list({task.id: task for task in tasks}.values())
+            if not tasks:
+                continue
+            first_index = self.streamed_tasks + 1
+            self.streamed_tasks += len(tasks)
             try:
-                print(f"  Задача {i}/{total_tasks}...", end=" ", flush=True)
-                
-                source_msg = next((m for m in session.messages if m.id == task.source_message_id), None)
-                if not source_msg:
-                    task.status = TaskStatus.MISSED
-                    task.missed_reason = "Исходное сообщение не найдено"
-                    print("пропущена (сообщение не найдено)")
-                    continue
-                
-                responses = self._get_responses_after(session, source_msg)
-                
-                if not responses:
-                    task.status = TaskStatus.MISSED
-                    task.missed_reason = "Нет ответов после запроса"
-                    print("пропущена (нет ответов)")
-                    continue
-                
-                responses_data = [{"id": r.id, "text": r.text} for r in responses]
-                task_data = {
-                    "description": task.description,
-                    "context": task.context or ""
-                }
-                
-                result = await self.ai_client.check_task_completion(task_data, responses_data)
-                
-                if result.get("completed", False):
-                    task.status = TaskStatus.COMPLETED
-                    task.response_message_id = result.get("response_message_id")
-                    task.completion_evidence = result.get("evidence", "")
-                    if task.response_message_id:
-                        response_msg = next((m for m in session.messages if m.id == task.response_message_id), None)
-                        if response_msg:
-                            task.response_message_text = response_msg.text
-                            task.completed_at = response_msg.timestamp
-                    print("выполнена")
-                else:
-                    task.status = TaskStatus.MISSED
-                    task.missed_reason = result.get("evidence", "Задача не была выполнена")
-                    print("пропущена")
-                
-                await asyncio.sleep(0.3)
+                await self._run_checks(session, tasks, first_index=first_index)
             except Exception as e:
-                print(f"ошибка: {e}")
-                task.status = TaskStatus.MISSED
-                task.missed_reason = f"Ошибка при проверке: {str(e)}"
-                continue
+                print(f"  Ошибка проверки {len(tasks)} задач: {e}")
+
+    async def _run_checks(self, session: ChatSession, tasks: List[Task], after_message_id: Optional[int] = None,
+                          first_index: Optional[int] = None):
+        total = f"/{len(tasks)}" if first_index is None else ""
+        pending: List[PendingCheck] = []
+        for i, task in enumerate(tasks, first_index or 1):
+            prefix = f"  Задача {i}{total}:"
+            responses = self._prepare_responses(session, task, prefix, after_message_id)
+            if responses:
+                pending.append((task, responses, prefix))
         
-        return tasks
+        groups = self._group_by_responses(pending)
+        if len(groups) < len(pending):
+            print(f"  Задачи с общими ответами объединены: {len(pending)} задач в {len(groups)} запросах")
+        
+        await asyncio.gather(*(
+            self._check_group(session, group) if len(group) > 1 else self._check_task(session, *group[0])
+            for group in groups
+        ))
+
+    def _prepare_responses(self, session: ChatSession, task: Task, prefix: str,
+                           after_message_id: Optional[int] = None) -> Optional[List[ChatMessage]]:
+        source_msg = session.get_message(task.source_message_id)
+        if after_message_id is not None and (not source_msg or source_msg.id <= after_message_id):
+            responses = self._get_responses_after(
+                session, session.first_position_after(after_message_id) - 1, task.requested_at, task
+            )
+            if not responses:
+                print(f"{prefix} без изменений (нет новых ответов)")
+            return responses
+        
+        if not source_msg:
+            task.status = TaskStatus.MISSED
+            task.missed_reason = "Исходное сообщение не найдено"
+            print(f"{prefix} пропущена (сообщение не найдено)")
+            return None
+        
+        responses = self._get_responses_after_mentions(session, task)
+        
+        if not responses:
+            task.status = TaskStatus.MISSED
+            task.missed_reason = "Нет ответов после запроса"
+            print(f"{prefix} пропущена (нет ответов)")
+        
+        return responses
 
-    def _get_responses_after(self, session: ChatSession, source_msg: ChatMessage, limit: int = 10) -> List[ChatMessage]:
-        responses = []
-        found_source = False
+    def _group_by_responses(self, pending: List[PendingCheck]) -> List[List[PendingCheck]]:
+        if self.batch_size <= 1:
+            return [[item] for item in pending]
         
-        for msg in session.messages:
-            if msg.id == source_msg.id:
-                found_source = True
+        groups = []
+        current: List[PendingCheck] = []
+        current_ids = set()
+        current_last = 0
+        
+        for item in sorted(pending, key=lambda item: item[1][0].id):
+            response_ids = {r.id for r in item[1]}
+            if (current and item[1][0].id <= current_last and len(current) < self.batch_size
+                    and len(current_ids | response_ids) <= settings.match_batch_max_responses):
+                current.append(item)
+                current_ids |= response_ids
+                current_last = max(current_last, item[1][-1].id)
                 continue
+            if current:
+                groups.append(current)
+            current = [item]
+            current_ids = response_ids
+            current_last = item[1][-1].id
+        
+        if current:
+            groups.append(current)
+        
+        return groups
+
+    async def _check_task(self, session: ChatSession, task: Task, responses: List[ChatMessage], prefix: str):
+        try:
+            responses_data = [{"id": r.id, "text": r.text} for r in responses]
+            task_data = {
+                "description": task.description,
+                "context": task.context or ""
+            }
             
-            if found_source and msg.role == MessageRole.DEVELOPER:
-                responses.append(msg)
-                if len(responses) >= limit:
-                    break
+            result = await self.ai_client.check_task_completion(task_data, responses_data)
+            
+            self._apply_result(session, task, result, prefix)
+        except Exception as e:
+            print(f"{prefix} ошибка: {e}")
+            task.status = TaskStatus.MISSED
+            task.missed_reason = f"Ошибка при проверке: {str(e)}"
+
+    async def _check_group(self, session: ChatSession, group: List[PendingCheck]):
+        responses_by_id: Dict[int, ChatMessage] = {}
+        for _, responses, _ in group:
+            for r in responses:
+                responses_by_id[r.id] = r
         
-        return responses
+        responses_data = [{"id": r.id, "text": r.text} for r in sorted(responses_by_id.values(), key=lambda r: r.id)]
+        tasks_data = [
+            {"id": task.id, "description": task.description, "context": task.context or ""}
+            for task, _, _ in group
+        ]
+        
+        try:
+            results = await self.ai_client.check_tasks_completion_batch(tasks_data, responses_data)
+        except Exception as e:
+            print(f"  Ошибка пакетной проверки ({len(group)} задач): {e}, проверка по одной")
+            results = {}
+        
+        fallback = []
+        for task, responses, prefix in group:
+            result = results.get(task.id)
+            if result is None:
+                fallback.append((task, responses, prefix))
+            else:
+                self._apply_result(session, task, result, prefix)
+        
+        await asyncio.gather(*(self._check_task(session, *item) for item in fallback))
+
+    def _apply_result(self, session: ChatSession, task: Task, result: Dict[str, Any], prefix: str):
+        if result.get("completed", False):
+            task.status = TaskStatus.COMPLETED
+            task.response_message_id = result.get("response_message_id")
+            task.completion_evidence = result.get("evidence", "")
+            if task.response_message_id:
+                response_msg = session.get_message(task.response_message_id)
+                if response_msg:
+                    task.response_message_text = response_msg.text
+                    task.completed_at = response_msg.timestamp
+            print(f"{prefix} выполнена")
+        elif task.status == TaskStatus.COMPLETED:
+            print(f"{prefix} повторная проверка не нашла ответа, задача остается выполненной")
+        else:
+            task.status = TaskStatus.MISSED
+            task.missed_reason = result.get("evidence", "Задача не была выполнена")
+            print(f"{prefix} пропущена")
+
+    def _get_responses_after_mentions(self, session: ChatSession, task: Task) -> List[ChatMessage]:
+        responses: Dict[int, ChatMessage] = {}
+        for message_id in task.source_message_ids:
+            msg = session.get_message(message_id)
+            if not msg:
+                continue
+            for response in self._get_responses_after(session, session.position_of(msg.id), msg.timestamp, task, msg.id):
+                responses[response.id] = response
+        return sorted(responses.values(), key=lambda r: r.id)
+
+    def _get_responses_after(self, session: ChatSession, position: int, requested_at: datetime,
+                             task: Optional[Task] = None, reply_to: Optional[int] = None) -> List[ChatMessage]:
+        until = None
+        if self.window_hours:
+            until = requested_at + timedelta(hours=self.window_hours)
+        
+        if task is None or not settings.response_retrieval_enabled:
+            return session.developer_messages_after(position, self.window_messages, until)
+        
+        if self.retriever is None or self.retriever.session is not session:
+            self.retriever = ResponseRetriever(session)
+        query = " ".join(filter(None, (task.description, task.source_message_text, task.context)))
+        return self.retriever.retrieve(query, position, until, reply_to or task.source_message_id)
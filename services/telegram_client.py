@@ -1,10 +1,12 @@
 import asyncio
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime
 from telethon import TelegramClient
 from telethon.tl.types import Message, User, Chat, Channel
 from config.settings import settings
 from models.chat import ChatSession, ChatMessage, MessageRole
+from models.compact import CompactMessage, CompactSession
+from services.message_store import MessageStore
 
 
 class TelegramImporter:
@@ -14,6 +16,7 @@ class TelegramImporter:
         self.phone = settings.telegram_phone
         self.session_name = settings.telegram_session_name
         self.client: Optional[TelegramClient] = None
+        self.message_store = MessageStore() if settings.message_store_enabled else None
 
     async def connect(self) -> bool:
         if not all([self.api_id, self.api_hash]):
@@ -83,24 +86,32 @@ class TelegramImporter:
         
         return results
 
-    async def import_chat(self, chat_id: int, limit: Optional[int] = None) -> ChatSession:
+    async def import_chat(self, chat_id: int, limit: Optional[int] = None, min_id: Optional[int] = None,
+                          compact: bool = False) -> Union[ChatSession, CompactSession]:
         if not self.client:
             raise Exception("Не подключен к Telegram")
         
         entity = await self.client.get_entity(chat_id)
         chat_title = getattr(entity, "title", None) or getattr(entity, "first_name", "Unknown")
         
+        if self.message_store:
+            fetched = await self._sync_to_store(entity, str(chat_id), chat_title)
+            print(f"Загружено новых сообщений из Telegram: {fetched}")
+            session = self.message_store.load_session(str(chat_id), chat_title, min_id=min_id, limit=limit)
+            return session if compact else session.to_session()
+        
         messages_list = []
-        async for message in self.client.iter_messages(entity, limit=limit):
+        async for message in self.client.iter_messages(entity, limit=limit, min_id=min_id or 0):
             if not message.text:
                 continue
             
-            role = MessageRole.CLIENT
-            if message.out:
-                role = MessageRole.DEVELOPER
-            
+            role = self._message_role(message)
             reply_to_id = message.reply_to_msg_id if message.reply_to else None
             
+            if compact:
+                messages_list.append(CompactMessage(message.id, message.text, role, message.date, reply_to_id))
+                continue
+            
             chat_msg = ChatMessage(
                 id=message.id,
                 text=message.text,
@@ -116,12 +127,13 @@ class TelegramImporter:
         
         messages_list.reverse()
         
-        for msg in messages_list:
-            if msg.reply_to_message_id:
-                for other_msg in messages_list:
-                    if other_msg.id == msg.reply_to_message_id:
-                        msg.reply_to_message = other_msg
-                        break
+        if compact:
+            return CompactSession(
+                chat_id=str(chat_id),
+                chat_title=chat_title,
+                source="telegram_api",
+                messages=messages_list
+            )
         
         session = ChatSession(
             chat_id=str(chat_id),
@@ -130,6 +142,40 @@ class TelegramImporter:
             messages=messages_list,
             total_messages=len(messages_list)
         )
+        session.link_replies()
         
         return session
 
+    async def _sync_to_store(self, entity, chat_id: str, chat_title: Optional[str]) -> int:
+        min_id = self.message_store.max_message_id(chat_id)
+        if min_id:
+            print(f"Локальная копия чата до сообщения #{min_id}, загрузка только новых...")
+        
+        batch = []
+        max_id = min_id
+        fetched = 0
+        async for message in self.client.iter_messages(entity, min_id=min_id, reverse=True):
+            fetched += 1
+            max_id = max(max_id, message.id)
+            if message.text:
+                batch.append((
+                    message.id,
+                    message.text,
+                    self._message_role(message).value,
+                    message.date.isoformat(),
+                    message.reply_to_msg_id if message.reply_to else None,
+                    message.sender_id
+                ))
+            
+            if fetched % settings.message_store_batch_size == 0:
+                self.message_store.save_batch(chat_id, chat_title, batch, max_id)
+                batch = []
+        
+        self.message_store.save_batch(chat_id, chat_title, batch, max_id)
+        return fetched
+
+    @staticmethod
+    def _message_role(message: Message) -> MessageRole:
+        if message.out:
+            return MessageRole.DEVELOPER
+        return MessageRole.CLIENT
@@ -0,0 +1,15 @@
+from typing import Any, Dict
+
+MESSAGE_OVERHEAD_TOKENS = 6
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    other_chars = len(text) - ascii_chars
+    return max(1, round(ascii_chars / 4 + other_chars / 2.5))
+
+
+def estimate_message_tokens(message: Dict[str, Any]) -> int:
+    return estimate_tokens(message.get("text", "")) + MESSAGE_OVERHEAD_TOKENS